@@ -3,23 +3,152 @@ import pandas as pd
 import yfinance as yf
 import numpy as np
 import datetime
+import hashlib
+import time
 
-def run_advanced_audit(journal_df):
-    st.markdown("### 🔬 Advanced System Analytics (Level 2)")
-    
-    # 1. Clean the Data
+from ttl_cache import TTLCache
+from monte_carlo import to_r_multiples, simulate_equity, bootstrap_metrics, simulate_buckets
+
+# --- AUDIT COMPUTE (PURE) ---
+# Everything that only depends on the filtered journal is built once per content hash and reused
+# across the 30s autorefresh reruns; the render stage below just draws the cached report.
+
+TIME_FILTERS = {"All Time": None, "Last 7 Days": 7, "Last 30 Days": 30}
+TIME_ZONES = ["1. Morning (9:15 - 11:00)", "2. Midday (11:00 - 14:00)", "3. Afternoon (14:00 - 15:30)"]
+MIN_MC_TRADES = 5
+
+@st.cache_resource
+def get_audit_cache():
+    # 🧮 Process-wide; a new journal row changes the hash, so the TTL only reclaims stale entries
+    return TTLCache(maxsize=32, ttl=3600)
+
+@st.cache_resource
+def get_mc_cache():
+    # 🎲 Separate store: every slider combination is a new key and must not evict audit reports
+    return TTLCache(maxsize=8, ttl=3600)
+
+def clean_journal(journal_df):
     df = journal_df.copy()
     if 'PnL' in df.columns:
         df['PnL'] = df['PnL'].astype(str).str.replace(r'[₹,a-zA-Z\s]', '', regex=True)
         df['PnL'] = pd.to_numeric(df['PnL'], errors='coerce').fillna(0)
-    
     df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
     df['ExitDate'] = pd.to_datetime(df['ExitDate'], errors='coerce')
-    
+    return df
+
+def filter_closed(df, time_filter, now):
+    days = TIME_FILTERS[time_filter]
+    if days is not None: df = df[df['ExitDate'] >= (now - pd.Timedelta(days=days))]
+    return df[df['ExitDate'].notnull() & (df['Result'] != '')].copy()
+
+def content_hash(df, *extra):
+    """Stable digest of a frame's columns + values, plus any extra key parts."""
+    h = hashlib.sha256(repr((list(df.columns), extra)).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def time_zone_of(entry_time):
+    """Vectorized session bucket for an EntryTime column ('%H:%M:%S'); unparseable times -> NaN."""
+    hour = pd.to_datetime(entry_time, format='%H:%M:%S', errors='coerce').dt.hour
+    return pd.cut(hour, bins=[-np.inf, 11, 14, np.inf], right=False, labels=TIME_ZONES)
+
+def compute_audit(closed_trades):
+    """Pure report for one filtered journal: baseline, strategy + time-of-day tables, MC inputs."""
+    pnl = closed_trades['PnL']
+    wins, losses = pnl[pnl > 0], pnl[pnl <= 0]
+    avg_win = wins.mean() if not wins.empty else 0
+    avg_loss = losses.mean() if not losses.empty else 0
+    report = {
+        "trades": len(closed_trades),
+        "win_rate": len(wins) / len(closed_trades) * 100,
+        "avg_win": avg_win, "avg_loss": avg_loss,
+        "rr_ratio": abs(avg_win / avg_loss) if avg_loss != 0 else float('inf'),
+        "strategy_stats": None, "time_stats": pd.DataFrame(), "time_data": pd.DataFrame(),
+    }
+
+    if 'Strategy' in closed_trades.columns:
+        report["strategy_stats"] = closed_trades.groupby('Strategy').agg(
+            Total_Trades=('Symbol', 'count'),
+            Net_Profit=('PnL', 'sum'),
+            Avg_PnL=('PnL', 'mean')
+        ).reset_index()
+
+    report["r_multiples"] = to_r_multiples(pnl)
+    # One 1R for every bucket, so per-Strategy / per-Time-Zone simulations stay comparable
+    closed_trades = closed_trades.assign(R=report["r_multiples"] if report["r_multiples"] is not None else np.nan)
+
+    if 'EntryTime' in closed_trades.columns:
+        time_data = closed_trades.assign(Time_Zone=time_zone_of(closed_trades['EntryTime']), Is_Win=pnl > 0)
+        time_data = time_data.dropna(subset=['Time_Zone'])
+        if not time_data.empty:
+            time_stats = time_data.groupby('Time_Zone', observed=True).agg(
+                Trades=('Symbol', 'count'),
+                Win_Rate=('Is_Win', 'mean'),
+                Net_Profit=('PnL', 'sum')
+            ).reset_index()
+            time_stats['Win_Rate'] *= 100
+            time_stats['Time_Zone'] = time_stats['Time_Zone'].astype(str)
+            report["time_stats"] = time_stats
+            report["time_data"] = time_data[['PnL', 'R', 'Time_Zone']]
+    return report
+
+def cached_audit(closed_trades, time_filter):
+    cache = get_audit_cache()
+    key = content_hash(closed_trades, time_filter)
+    report = cache.get(key)
+    if report is None:
+        t0 = time.perf_counter()
+        report = compute_audit(closed_trades)
+        report["key"], report["compute_ms"] = key, (time.perf_counter() - t0) * 1000
+        cache.set(key, report)
+    return report
+
+def cached_monte_carlo(report, closed_trades, risk_per_trade, n_paths, horizon, ruin_dd, bucket_by):
+    """Simulation results keyed on the report hash + every knob, so reruns reuse the same paths."""
+    cache = get_mc_cache()
+    key = (report["key"], risk_per_trade, n_paths, horizon, ruin_dd, bucket_by)
+    mc = cache.get(key)
+    if mc is None:
+        mc = {
+            "sim": simulate_equity(report["r_multiples"], risk_per_trade, n_paths=n_paths, horizon=horizon, ruin_dd=ruin_dd / 100),
+            "ci": bootstrap_metrics(closed_trades['PnL']),
+            "buckets": None,
+        }
+        if bucket_by == "Per Strategy" and 'Strategy' in closed_trades.columns: pool, by = closed_trades.assign(R=report["r_multiples"]), 'Strategy'
+        elif bucket_by == "Per Time Zone" and not report["time_data"].empty: pool, by = report["time_data"], 'Time_Zone'
+        else: pool, by = None, None
+        if pool is not None:
+            mc["buckets"] = simulate_buckets(pool, by, risk_per_trade, n_paths=min(n_paths, 25_000), horizon=horizon, ruin_dd=ruin_dd / 100)
+        cache.set(key, mc)
+    return mc
+
+def build_recommendations(report, avg_missed):
+    recs = []
+    if avg_missed > 2.5:
+        recs.append(f"🔴 **TIGHTEN TRAILING STOP:** You are leaving **{avg_missed:.2f}%** on the table. Consider lowering the 6.0% threshold.")
+    elif avg_missed < 1.0:
+        recs.append(f"🟢 **TRAILING STOP HEALTHY:** You are catching peaks perfectly ({avg_missed:.2f}% missed).")
+
+    time_stats = report["time_stats"]
+    if not time_stats.empty:
+        worst = time_stats.loc[time_stats['Win_Rate'].idxmin()]
+        if worst['Win_Rate'] < 35.0 and worst['Trades'] >= 3:
+            recs.append(f"🔴 **IMPLEMENT TIME LOCK:** The **{worst['Time_Zone']}** session is underperforming ({worst['Win_Rate']:.1f}%).")
+
+    if report["win_rate"] < 40.0 and report["rr_ratio"] < 1.2:
+        recs.append("🔴 **SYSTEM BLEED:** High churn, low reward. Widen initial stop or tighten entry criteria.")
+    elif report["win_rate"] >= 50.0:
+        recs.append("🟢 **SYSTEM HEALTHY:** Math is currently in your favor.")
+    return recs
+
+# --- AUDIT RENDER ---
+def run_advanced_audit(journal_df, risk_per_trade=1.5):
+    st.markdown("### 🔬 Advanced System Analytics (Level 2)")
+
     # --- TIMEFRAME FILTER ---
     st.markdown("#### 📅 Select Timeframe")
-    time_filter = st.radio("Analyze Data For:", ["All Time", "Last 7 Days", "Last 30 Days"], horizontal=True)
-    
+    time_filter = st.radio("Analyze Data For:", list(TIME_FILTERS), horizontal=True)
+
     if 'current_filter' not in st.session_state or st.session_state.current_filter != time_filter:
         st.session_state.enrichment_run = False
         st.session_state.enrichment_data = pd.DataFrame()
@@ -27,103 +156,97 @@ def run_advanced_audit(journal_df):
 
     # --- CLOUD TIMEZONE FIX ---
     now = pd.Timestamp.now(tz='Asia/Kolkata').tz_localize(None)
-    
-    if time_filter == "Last 7 Days":
-        df = df[df['ExitDate'] >= (now - pd.Timedelta(days=7))]
-    elif time_filter == "Last 30 Days":
-        df = df[df['ExitDate'] >= (now - pd.Timedelta(days=30))]
-    
-    closed_trades = df[df['ExitDate'].notnull() & (df['Result'] != '')].copy()
-    
+    closed_trades = filter_closed(clean_journal(journal_df), time_filter, now)
+
     if closed_trades.empty:
         st.warning(f"Not enough closed trades in the '{time_filter}' timeframe to run advanced analytics.")
         return
 
-    # 2. Crunch the Core Metrics (Level 1)
-    winning_trades = closed_trades[closed_trades['PnL'] > 0]
-    losing_trades = closed_trades[closed_trades['PnL'] <= 0]
-    
-    avg_win = winning_trades['PnL'].mean() if not winning_trades.empty else 0
-    avg_loss = losing_trades['PnL'].mean() if not losing_trades.empty else 0
-    rr_ratio = abs(avg_win / avg_loss) if avg_loss != 0 else float('inf')
-    win_rate = (len(winning_trades) / len(closed_trades)) * 100 if len(closed_trades) > 0 else 0
-    
+    report = cached_audit(closed_trades, time_filter)
+    st.caption(f"⚡ Report {report['key'][:8]} • computed in {report['compute_ms']:.0f} ms, reused until the journal changes")
+
     st.markdown("#### ⚖️ The Business Baseline")
     c1, c2, c3, c4 = st.columns(4)
-    c1.metric("Win Rate", f"{win_rate:.1f}%")
-    c2.metric("Avg Winner", f"₹{avg_win:,.2f}")
-    c3.metric("Avg Loser", f"₹{avg_loss:,.2f}")
-    c4.metric("Reward-to-Risk", f"{rr_ratio:.2f} : 1")
-    
+    c1.metric("Win Rate", f"{report['win_rate']:.1f}%")
+    c2.metric("Avg Winner", f"₹{report['avg_win']:,.2f}")
+    c3.metric("Avg Loser", f"₹{report['avg_loss']:,.2f}")
+    c4.metric("Reward-to-Risk", f"{report['rr_ratio']:.2f} : 1")
+
     st.divider()
 
     # 2.5 Strategy Showdown
     st.markdown("#### ⚔️ Strategy Showdown")
-    if 'Strategy' in closed_trades.columns:
-        strategy_group = closed_trades.groupby('Strategy').agg(
-            Total_Trades=('Symbol', 'count'),
-            Net_Profit=('PnL', 'sum'),
-            Avg_PnL=('PnL', 'mean')
-        ).reset_index()
-        
-        strategy_group['Net_Profit'] = strategy_group['Net_Profit'].apply(lambda x: f"₹{x:,.2f}")
-        strategy_group['Avg_PnL'] = strategy_group['Avg_PnL'].apply(lambda x: f"₹{x:,.2f}")
-        st.dataframe(strategy_group, use_container_width=True, hide_index=True)
+    if report["strategy_stats"] is not None:
+        st.dataframe(report["strategy_stats"].style.format({"Net_Profit": "₹{:,.2f}", "Avg_PnL": "₹{:,.2f}"}), use_container_width=True, hide_index=True)
 
     st.divider()
 
     # 3. Time-of-Day Optimization
     st.markdown("#### ⏱️ Time-of-Day Optimization")
-    time_data = closed_trades[closed_trades['EntryTime'].notnull() & (closed_trades['EntryTime'] != '')].copy()
-    
-    if not time_data.empty:
-        time_data['EntryHour'] = pd.to_datetime(time_data['EntryTime'], format='%H:%M:%S', errors='coerce').dt.hour
-        
-        def categorize_time(hour):
-            if pd.isna(hour): return None
-            if hour < 11: return "1. Morning (9:15 - 11:00)"
-            elif hour < 14: return "2. Midday (11:00 - 14:00)"
-            else: return "3. Afternoon (14:00 - 15:30)"
-            
-        time_data['Time_Zone'] = time_data['EntryHour'].apply(categorize_time)
-        time_data = time_data.dropna(subset=['Time_Zone'])
-        
-        time_stats = time_data.groupby('Time_Zone').agg(
-            Trades=('Symbol', 'count'),
-            Win_Rate=('PnL', lambda x: f"{(len(x[x>0])/len(x))*100:.1f}%" if len(x) > 0 else "0.0%"),
-            Net_Profit=('PnL', 'sum')
-        ).reset_index()
-        
-        time_stats['Net_Profit'] = time_stats['Net_Profit'].apply(lambda x: f"₹{x:,.2f}")
-        st.dataframe(time_stats, use_container_width=True, hide_index=True)
+    if not report["time_stats"].empty:
+        st.dataframe(report["time_stats"].style.format({"Win_Rate": "{:.1f}%", "Net_Profit": "₹{:,.2f}"}), use_container_width=True, hide_index=True)
     else:
         st.info("No trades with valid timestamps found for time optimization.")
-        
+
+    st.divider()
+
+    # 3.5 Monte Carlo Stress Test
+    st.markdown("#### 🎲 Monte Carlo Stress Test")
+    st.caption(f"Resamples your closed trades into thousands of equity paths, risking {risk_per_trade}% of equity per trade (1R = your average loser).")
+
+    if report["r_multiples"] is None or report["trades"] < MIN_MC_TRADES:
+        st.info(f"Need at least {MIN_MC_TRADES} closed trades, including a loser, to stress-test the equity curve.")
+    elif st.checkbox("Run Monte Carlo Simulation", key="mc_run"):
+        m1, m2, m3 = st.columns(3)
+        n_paths = m1.select_slider("Paths", options=[10_000, 25_000, 50_000, 100_000], value=100_000)
+        horizon = m2.slider("Trades per Path", 20, 500, 100, step=10)
+        ruin_dd = m3.slider("Ruin = Drawdown of (%)", 10, 90, 50, step=5)
+        bucket_by = st.radio("Bootstrap Pool:", ["All Trades", "Per Strategy", "Per Time Zone"], horizontal=True, key="mc_bucket")
+
+        with st.spinner("Simulating equity paths..."):
+            mc = cached_monte_carlo(report, closed_trades, risk_per_trade, n_paths, horizon, ruin_dd, bucket_by)
+        sim = mc["sim"]
+
+        d1, d2, d3, d4 = st.columns(4)
+        d1.metric("Median Max DD", f"{sim['drawdown'][50]:.1f}%")
+        d2.metric("95th pct Max DD", f"{sim['drawdown'][95]:.1f}%")
+        d3.metric("Risk of Ruin", f"{sim['risk_of_ruin']:.2f}%")
+        d4.metric("Median Return", f"{sim['final_equity'][50]:+.1f}%")
+        st.caption("Max drawdown percentiles: " + " | ".join(f"P{p}: {v:.1f}%" for p, v in sim['drawdown'].items())
+                   + f"  •  Return 5th-95th: {sim['final_equity'][5]:+.1f}% to {sim['final_equity'][95]:+.1f}%  •  {sim['paths']:,} paths in {sim['elapsed']:.2f}s")
+
+        st.markdown("**95% Confidence Intervals (Bootstrap)**")
+        st.dataframe(mc["ci"].round(2), use_container_width=True, hide_index=True)
+
+        if mc["buckets"] is not None:
+            if mc["buckets"].empty: st.info("No bucket has enough trades to simulate.")
+            else: st.dataframe(mc["buckets"].round(2), use_container_width=True, hide_index=True)
+
     st.divider()
 
     # 4. Level 2 Enrichment: MFE & MAE
     st.markdown("#### 🚀 Level 2 Analytics: Intraday Excursion (MFE / MAE)")
     st.caption("Reverse-engineers historical 1-minute data (Last 7 days only) to analyze efficiency.")
-    
+
     if 'enrichment_run' not in st.session_state:
         st.session_state.enrichment_run = False
         st.session_state.enrichment_data = pd.DataFrame()
 
     c1, c2 = st.columns([1, 1])
-    
+
     if c1.button("🔄 Run/Refresh Post-Trade Enrichment"):
         st.session_state.enrichment_run = True
         with st.spinner("Firing up the time machine..."):
             try:
                 tickers = closed_trades['Ticker'].dropna().unique().tolist()
                 hist_data = yf.download(tickers, period="7d", interval="1m", progress=False, threads=True)
-                
+
                 enriched_results = []
                 for _, trade in closed_trades.iterrows():
                     sym, tck = trade['Symbol'], trade['Ticker']
                     buy_px, exit_px = float(trade['BuyPrice']), float(trade['ExitPrice'])
                     mfe, mae = buy_px, buy_px
-                    
+
                     if not hist_data.empty and tck in hist_data['High'].columns:
                         try:
                             # --- TIME MACHINE CRASH FIX ---
@@ -131,26 +254,26 @@ def run_advanced_audit(journal_df):
                                 entry_dt = pd.to_datetime(trade['Date']).tz_localize(None)
                             else:
                                 entry_dt = pd.to_datetime(f"{trade['Date']} {trade['EntryTime']}").tz_localize(None)
-                                
+
                             exit_dt = pd.to_datetime(f"{trade['ExitDate']} {trade['ExitTime']}").tz_localize(None)
-                            
+
                             t_high = hist_data['High'][tck].dropna()
                             t_low = hist_data['Low'][tck].dropna()
                             t_high.index = t_high.index.tz_localize(None)
                             t_low.index = t_low.index.tz_localize(None)
-                            
+
                             window_h = t_high[(t_high.index >= entry_dt) & (t_high.index <= exit_dt)]
                             window_l = t_low[(t_low.index >= entry_dt) & (t_low.index <= exit_dt)]
-                            
+
                             if not window_h.empty: mfe = window_h.max()
                             if not window_l.empty: mae = window_l.min()
-                        except: pass 
-                    
+                        except: pass
+
                     if mfe == buy_px and exit_px > buy_px: mfe = exit_px
                     if mae == buy_px and exit_px < buy_px: mae = exit_px
-                    
+
                     left_pct = ((mfe - exit_px) / buy_px) * 100 if mfe > exit_px else 0.0
-                    
+
                     enriched_results.append({
                         "Date": trade['Date'], "Symbol": sym, "Entry": f"₹{buy_px:,.2f}",
                         "Exit": f"₹{exit_px:,.2f}", "Peak Price (MFE)": f"₹{mfe:,.2f}",
@@ -168,31 +291,13 @@ def run_advanced_audit(journal_df):
     if st.session_state.enrichment_run and not st.session_state.enrichment_data.empty:
         st.success("✅ Intraday Enrichment Complete! (Data Cached)")
         st.dataframe(st.session_state.enrichment_data, use_container_width=True, hide_index=True)
-        
+
         # --- 5. AUTOMATED AI CONCLUSION & ACTION PLAN ---
         st.divider()
         st.markdown("### 🧠 Automated Quant Conclusion & Action Plan")
-        
-        en_df = st.session_state.enrichment_data.copy()
-        en_df['Missed_Float'] = en_df['Missed Profit %'].str.replace('%', '').astype(float)
-        avg_missed = en_df['Missed_Float'].mean()
-        
-        recs = []
-        if avg_missed > 2.5:
-            recs.append(f"🔴 **TIGHTEN TRAILING STOP:** You are leaving **{avg_missed:.2f}%** on the table. Consider lowering the 6.0% threshold.")
-        elif avg_missed < 1.0:
-            recs.append(f"🟢 **TRAILING STOP HEALTHY:** You are catching peaks perfectly ({avg_missed:.2f}% missed).")
-        
-        if 'time_stats' in locals() and not time_stats.empty:
-            time_stats['WF'] = time_stats['Win_Rate'].str.replace('%', '').astype(float)
-            worst = time_stats.loc[time_stats['WF'].idxmin()]
-            if worst['WF'] < 35.0 and worst['Trades'] >= 3:
-                recs.append(f"🔴 **IMPLEMENT TIME LOCK:** The **{worst['Time_Zone']}** session is underperforming ({worst['Win_Rate']}).")
-
-        if win_rate < 40.0 and rr_ratio < 1.2:
-            recs.append("🔴 **SYSTEM BLEED:** High churn, low reward. Widen initial stop or tighten entry criteria.")
-        elif win_rate >= 50.0:
-            recs.append("🟢 **SYSTEM HEALTHY:** Math is currently in your favor.")
+
+        avg_missed = st.session_state.enrichment_data['Missed Profit %'].str.replace('%', '').astype(float).mean()
+        recs = build_recommendations(report, avg_missed)
 
         for r in recs:
             st.markdown(r)
@@ -0,0 +1,167 @@
+import time
+import threading
+
+import pandas as pd
+import numpy as np
+import yfinance as yf
+
+# --- MULTI-TIMEFRAME BARS ---
+# One 1-minute OHLCV stream for the whole universe; 5m/15m/60m and today's partial daily bar are
+# resampled locally. Each ingest only rebuilds the buckets from the first minute that changed.
+
+FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+TIMEFRAMES = {"5m": 5, "15m": 15, "60m": 60}
+SESSION_OFFSET = pd.Timedelta(minutes=15)  # NSE buckets are anchored on the 9:15 open
+
+def _bucket_start(ts, minutes):
+    base = ts.normalize() + SESSION_OFFSET
+    k = int(np.floor((ts - base) / pd.Timedelta(minutes=minutes)))
+    return base + pd.Timedelta(minutes=minutes * k)
+
+def _resample(m1, minutes):
+    out = {}
+    for field, how in AGG.items():
+        out[field] = m1[field].resample(f"{minutes}min", origin="start_day", offset=SESSION_OFFSET).agg(how)
+    # Overnight / lunch-less gaps produce empty buckets: drop bars where nothing traded
+    traded = out["Close"].notna().any(axis=1)
+    return {field: frame[traded] for field, frame in out.items()}
+
+class BarAggregator:
+    def __init__(self, timeframes=TIMEFRAMES, keep_days=5):
+        self.timeframes = dict(timeframes)
+        self.keep_days = keep_days
+        self.m1 = None
+        self.bars = {tf: None for tf in self.timeframes}
+        self.daily = pd.DataFrame(columns=FIELDS)
+
+    @staticmethod
+    def _normalize(raw, tickers):
+        frames = {}
+        for field in FIELDS:
+            frame = raw[field]
+            # Single-ticker downloads come back flat: name the column after the ticker, not the field
+            if isinstance(frame, pd.Series): frame = frame.to_frame(tickers[0])
+            if frame.index.tz is None: frame.index = frame.index.tz_localize('Asia/Kolkata')
+            else: frame.index = frame.index.tz_convert('Asia/Kolkata')
+            frames[field] = frame.sort_index()
+        return frames
+
+    def _first_changed(self, new):
+        """Earliest minute that is new or was revised since the last ingest (None if nothing moved)."""
+        old_close, new_close = self.m1["Close"], new["Close"]
+        fresh = new_close.index.difference(old_close.index)
+        overlap = new_close.index.intersection(old_close.index)
+        cols = new_close.columns.intersection(old_close.columns)
+        a = new_close.loc[overlap, cols]
+        b = old_close.loc[overlap, cols]
+        revised = overlap[((a != b) & ~(a.isna() & b.isna())).any(axis=1).to_numpy()]
+        if len(new_close.columns.difference(old_close.columns)) > 0:
+            return new_close.index.min()
+        candidates = fresh.append(revised)
+        return candidates.min() if len(candidates) else None
+
+    def ingest(self, raw, tickers):
+        """Feeds a yf.download(tickers, interval='1m') frame. Returns the first changed minute (or None)."""
+        if raw is None or raw.empty: return None
+        new = self._normalize(raw, tickers)
+
+        if self.m1 is None:
+            self.m1 = new
+            first = new["Close"].index.min()
+        else:
+            first = self._first_changed(new)
+            if first is None: return None
+            for field in FIELDS:
+                old = self.m1[field]
+                self.m1[field] = pd.concat([old[old.index < first], new[field][new[field].index >= first]])
+
+        # Bound memory: keep only the last `keep_days` sessions of minutes
+        days = self.m1["Close"].index.normalize().unique()
+        if len(days) > self.keep_days:
+            cutoff = days[-self.keep_days]
+            self.m1 = {f: frame[frame.index >= cutoff] for f, frame in self.m1.items()}
+
+        for tf, minutes in self.timeframes.items():
+            start = _bucket_start(first, minutes)
+            tail = _resample({f: frame[frame.index >= start] for f, frame in self.m1.items()}, minutes)
+            prev = self.bars[tf]
+            if prev is None: self.bars[tf] = tail
+            else:
+                self.bars[tf] = {f: pd.concat([prev[f][prev[f].index < start], tail[f]]) for f in FIELDS}
+                if len(days) > self.keep_days:
+                    self.bars[tf] = {f: frame[frame.index >= cutoff] for f, frame in self.bars[tf].items()}
+
+        self._refresh_daily()
+        return first
+
+    def _refresh_daily(self):
+        close = self.m1["Close"]
+        today = close.index.normalize().max()
+        rows = close.index.normalize() == today
+        m1 = {f: frame[rows] for f, frame in self.m1.items()}
+        self.daily = pd.DataFrame({
+            "Open": m1["Open"].bfill().iloc[0], "High": m1["High"].max(), "Low": m1["Low"].min(),
+            "Close": m1["Close"].ffill().iloc[-1], "Volume": m1["Volume"].sum(),
+        })
+        self.daily.attrs["date"] = today
+
+    def series(self, ticker, tf):
+        """(close, volume) for one ticker on an intraday timeframe, gaps dropped."""
+        bars = self.bars.get(tf)
+        if bars is None or ticker not in bars["Close"].columns:
+            return pd.Series(dtype=float), pd.Series(dtype=float)
+        close = bars["Close"][ticker].dropna()
+        return close, bars["Volume"][ticker].reindex(close.index).fillna(0)
+
+    def with_today(self, ticker, close, volume):
+        """Daily (close, volume) with today's partial bar from the 1m feed in place of (or after) the last row."""
+        if ticker not in self.daily.index or pd.isna(self.daily.at[ticker, "Close"]): return close, volume
+        day = pd.Timestamp(self.daily.attrs["date"].date())
+        if close.index.tz is not None: day = day.tz_localize(close.index.tz)
+        today = self.daily.loc[ticker]
+        close = pd.concat([close[close.index < day], pd.Series([float(today["Close"])], index=[day])])
+        volume = pd.concat([volume[volume.index < day], pd.Series([int(today["Volume"])], index=[day])])
+        return close, volume
+
+    def setup_series(self, ticker, tf, close, volume):
+        """Sniper setup bars: an intraday timeframe, or for '1D' the daily history topped up with today."""
+        if tf in self.timeframes: return self.series(ticker, tf)
+        return self.with_today(ticker, close, volume)
+
+    def last_closes(self):
+        """Latest 1m print per ticker, as the wide frame latest_prices() expects."""
+        if self.m1 is None: return pd.DataFrame()
+        return self.m1["Close"]
+
+class IntradayFeed:
+    """Process-wide 1m feed: first pull covers `warmup_period` for indicator history, then only today.
+
+    Only tickers some caller asked for within `expire_after` seconds are downloaded, so one Scalp
+    session doesn't keep the whole universe on the wire after everyone is back on Swing.
+    """
+
+    def __init__(self, ttl=25, warmup_period="5d", expire_after=90):
+        self.ttl = ttl
+        self.warmup_period = warmup_period
+        self.expire_after = expire_after
+        self.agg = BarAggregator()
+        self.tickers = set()
+        self.last_asked = {}
+        self.fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, tickers):
+        with self._lock:
+            now = time.monotonic()
+            for t in tickers: self.last_asked[t] = now
+            missing = set(tickers) - self.tickers
+            if missing or now - self.fetched_at >= self.ttl:
+                self.last_asked = {t: at for t, at in self.last_asked.items() if now - at < self.expire_after}
+                period = self.warmup_period if (self.agg.m1 is None or missing) else "1d"
+                universe = sorted(self.last_asked)
+                raw = yf.download(universe, period=period, interval="1m", threads=False, progress=False)
+                self.agg.ingest(raw, universe)
+                self.tickers = set(universe)
+                self.fetched_at = time.monotonic()
+            return self.agg
@@ -0,0 +1,239 @@
+import argparse
+import datetime
+import math
+import time
+
+import pytz
+
+from quant_engine import SWING_MODE, SCALP_MODE, TICKERS, INDEX_TICKERS, BUY_STATUSES, market_regime, scan_symbol, confirm_signal, new_trade_record
+from portfolio_book import build_book, latest_prices, value_book, closed_trade_record
+from risk_matrix import RollingCorrelation
+from market_data import MarketStore
+from bars import IntradayFeed
+from sheets_store import load_credentials, authorize, read_tab, write_portfolio, append_journal, append_signal, signals_for_day, write_heartbeat
+
+# --- HEADLESS ENGINE ---
+# Runs the scan -> buy -> stop management loop on a fixed 30s clock during market hours, with no
+# browser attached. State lives in Swing_Trading_DB; the Streamlit terminal detects the heartbeat
+# and switches itself to a read-only viewer.
+#
+#   python engine.py --mode swing --risk 1.5
+#   python engine.py --keyfile service_account.json --once
+#   python engine.py --once --force      # one cycle even outside market hours (testing only)
+
+ist = pytz.timezone('Asia/Kolkata')
+MARKET_OPEN = datetime.time(9, 15)
+MARKET_CLOSE = datetime.time(15, 30)
+MODES = {"swing": SWING_MODE, "scalp": SCALP_MODE}
+
+def is_market_active(now):
+    return (now.weekday() < 5) and (MARKET_OPEN <= now.time() < MARKET_CLOSE)
+
+def log(msg):
+    print(f"[{datetime.datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+class Engine:
+    def __init__(self, client, mode, risk_per_trade, gate_concentration=True, max_per_sector=3, max_avg_corr=0.6, data_ttl=60, sniper_tf="15m"):
+        self.client = client
+        self.mode = mode
+        self.sniper_tf = sniper_tf
+        self.risk_per_trade = risk_per_trade
+        self.gate_concentration = gate_concentration
+        self.max_per_sector = max_per_sector
+        self.max_avg_corr = max_avg_corr
+
+        self.portfolio = read_tab(client, "Portfolio")
+        self.journal = read_tab(client, "Journal")
+        self.risk_matrix = RollingCorrelation(TICKERS, window=60)
+
+        self.day = None
+        self.signal_history = {}
+        self.blacklist = []
+        self.cycle = 0
+        self.market_store = MarketStore(TICKERS + INDEX_TICKERS, ttl=data_ttl)
+        self.intraday_feed = IntradayFeed(ttl=max(data_ttl // 2, 1))
+
+    def _roll_day(self, now):
+        today_str = now.strftime("%Y-%m-%d")
+        if self.day == today_str: return
+        self.day = today_str
+        self.blacklist = []
+        try: self.signal_history = signals_for_day(read_tab(self.client, "Signal_Log"), today_str)
+        except Exception as e:
+            log(f"Signal_Log load failed: {e}")
+            self.signal_history = {}
+
+    def _market_data(self):
+        # Daily bars only change once a minute upstream; match the terminal's 60s store TTL
+        market_data = self.market_store.get()
+        closes = market_data.closes_frame()
+        if not closes.empty: self.risk_matrix.update(closes)
+        return market_data, closes
+
+    def _log_signal(self, sig, status, signal_time):
+        f = sig["features"]
+        for attempt in range(3):
+            try:
+                append_signal(self.client, self.day, sig["symbol"], signal_time, status, f["Nifty_Trend"], f["VIX"], f["RVol"], f["RSI"], f["SMA200_Dist"], sig["price"])
+                return True
+            except: time.sleep(1)
+        return False
+
+    def _intraday_bars(self, tickers):
+        if not tickers: return None
+        try: return self.intraday_feed.get(tickers)
+        except Exception as e:
+            log(f"1m feed failed: {e}")
+            return None
+
+    @property
+    def sniper_feed(self):
+        # Scalp reads setups off the 1m feed: resampled intraday bars, or today's partial bar for '1D'
+        return self.mode == SCALP_MODE
+
+    def _feed_universe(self):
+        return (TICKERS if self.sniper_feed else []) + [x['Ticker'] for x in self.portfolio]
+
+    def scan(self, now):
+        """One scanner pass. Returns True if the bot bought anything."""
+        market_data, closes = self._market_data()
+        regime = market_regime(closes)
+        intraday_bars = self._intraday_bars(self._feed_universe()) if self.sniper_feed else None
+        bought = False
+
+        for ticker in TICKERS:
+            try:
+                if ticker not in market_data.pos: continue
+                daily = market_data.series(ticker)
+                setup = intraday_bars.setup_series(ticker, self.sniper_tf, *daily) if intraday_bars else None
+                sig = scan_symbol(ticker, *daily, self.mode, regime, setup=setup, setup_tf=self.sniper_tf)
+                if sig is None: continue
+                symbol, status = sig["symbol"], sig["status"]
+
+                if sig["raw_trigger"] and symbol not in self.signal_history:
+                    signal_time = now.strftime("%H:%M")
+                    self.signal_history[symbol] = signal_time
+                    self._log_signal(sig, status, signal_time)
+
+                if symbol in self.signal_history:
+                    status = confirm_signal(sig, self.signal_history[symbol], now.time(), regime["is_safe_to_buy"])
+
+                if status not in BUY_STATUSES: continue
+                if symbol in self.blacklist or any(x['Symbol'] == symbol for x in self.portfolio): continue
+
+                if self.gate_concentration:
+                    allowed, reason = self.risk_matrix.check_entry(ticker, [x['Ticker'] for x in self.portfolio], self.max_avg_corr, self.max_per_sector)
+                    if not allowed: continue
+
+                self.portfolio.append(new_trade_record(sig, now, self.mode, self.risk_per_trade))
+                bought = True
+                log(f"🟢 BOT BOUGHT: {symbol} at ₹{sig['price']:.2f}")
+            except Exception as e:
+                log(f"Scan error on {ticker}: {e}")
+        return bought
+
+    def manage_exits(self, now):
+        """Vectorized stop management + auto-sell. Returns True if the stored book needs rewriting."""
+        if not self.portfolio: return False
+        book = build_book(self.portfolio)
+        intraday_bars = self._intraday_bars(self._feed_universe())
+        live_data = intraday_bars.last_closes() if intraday_bars else None
+        val = value_book(book, latest_prices(live_data, book['ticker']))
+
+        today_str = now.strftime("%Y-%m-%d")
+        sold_today = {j.get('Symbol') for j in self.journal if str(j.get('ExitDate')) == today_str}
+        changed = bool(val['stop_moved'].any())
+        remaining = []
+
+        for i, trade in enumerate(self.portfolio):
+            if val['stop_moved'][i]: trade['StopPrice'] = float(val['new_sl'][i])
+
+            if trade['Symbol'] in sold_today:
+                changed = True
+                if trade['Symbol'] not in self.blacklist: self.blacklist.append(trade['Symbol'])
+                continue
+
+            if val['stop_hit'][i]:
+                price, pnl = float(val['price'][i]), float(val['pnl'][i])
+                closed_trade = closed_trade_record(trade, price, pnl, now)
+                try:
+                    append_journal(self.client, closed_trade)
+                    self.journal.append(closed_trade)
+                    self.blacklist.append(trade['Symbol'])
+                    changed = True
+                    log(f"🛑 AUTO-SOLD: {trade['Symbol']} at ₹{price:.2f}")
+                    continue
+                except Exception as e:
+                    log(f"Journal write failed for {trade['Symbol']}: {e}")
+
+            remaining.append(trade)
+
+        self.portfolio = remaining
+        return changed
+
+    def run_cycle(self):
+        now = datetime.datetime.now(ist)
+        self._roll_day(now)
+        self.cycle += 1
+        t0 = time.perf_counter()
+        status = "OK"
+        try:
+            bought = self.scan(now)
+            changed = self.manage_exits(now)
+            if bought or changed:
+                try: write_portfolio(self.client, self.portfolio)
+                except Exception as e: log(f"Cloud Save Error: {e}")
+        except Exception as e:
+            status = f"ERROR: {e}"
+            log(f"Cycle {self.cycle} failed: {e}")
+        cycle_ms = round((time.perf_counter() - t0) * 1000)
+        self.heartbeat(now, cycle_ms, status)
+        return cycle_ms
+
+    def heartbeat(self, now, cycle_ms, status):
+        try: write_heartbeat(self.client, now.strftime("%Y-%m-%d %H:%M:%S"), self.cycle, cycle_ms, self.mode, self.sniper_tf, len(self.portfolio), status)
+        except Exception as e: log(f"Heartbeat failed: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless scan/trade loop for the Elite Quant Terminal.")
+    parser.add_argument("--mode", choices=sorted(MODES), default="swing")
+    parser.add_argument("--sniper-tf", choices=["5m", "15m", "60m", "1D"], default="15m", help="Scalp-mode setup timeframe")
+    parser.add_argument("--risk", type=float, default=1.5, help="Risk per trade (%%)")
+    parser.add_argument("--interval", type=float, default=30.0, help="Cycle length in seconds")
+    parser.add_argument("--keyfile", help="Service-account JSON (default: .streamlit/secrets.toml)")
+    parser.add_argument("--no-gate", action="store_true", help="Disable the sector/correlation concentration gate")
+    parser.add_argument("--max-per-sector", type=int, default=3)
+    parser.add_argument("--max-avg-corr", type=float, default=0.6)
+    parser.add_argument("--once", action="store_true", help="Run a single cycle and exit")
+    parser.add_argument("--force", action="store_true", help="With --once: run the cycle even outside market hours")
+    args = parser.parse_args()
+
+    client = authorize(load_credentials(args.keyfile))
+    engine = Engine(client, MODES[args.mode], args.risk, not args.no_gate, args.max_per_sector, args.max_avg_corr, sniper_tf=args.sniper_tf)
+    log(f"Engine started in {engine.mode} with {len(engine.portfolio)} open positions.")
+
+    if args.once:
+        # 🛡️ Same gate as the loop: after hours it would trade stale closes and log off-session signals
+        now = datetime.datetime.now(ist)
+        if is_market_active(now) or args.force: log(f"Cycle done in {engine.run_cycle()} ms")
+        else:
+            engine.heartbeat(now, 0, "IDLE (Market Closed)")
+            log("Market closed: skipped the cycle (use --force to run it anyway).")
+        return
+
+    # ⏱️ Fixed-rate clock: ticks are scheduled from the start time, so render/IO time never drifts the cadence
+    next_tick = time.monotonic()
+    while True:
+        now = datetime.datetime.now(ist)
+        if is_market_active(now): engine.run_cycle()
+        else: engine.heartbeat(now, 0, "IDLE (Market Closed)")
+
+        next_tick += args.interval
+        lag = time.monotonic() - next_tick
+        if lag > 0:
+            # Overran one or more ticks: skip them instead of firing back-to-back
+            next_tick += math.ceil(lag / args.interval) * args.interval
+        time.sleep(max(0.0, next_tick - time.monotonic()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+import numpy as np
+import yfinance as yf
+
+from market_data import MarketData
+from sheets_store import load_credentials, authorize, read_tab
+
+# --- ML FEATURE STORE ---
+# Turns Signal_Log (+ Journal outcomes) into a versioned training set. Every signal is mapped to
+# (ticker row, bar column) in one compact close matrix, so forward-return / stop-hit labels for all
+# horizons and the as-of feature recompute are array gathers, not a loop over signals.
+#
+#   python feature_store.py                       # read Swing_Trading_DB via .streamlit/secrets.toml
+#   python feature_store.py --signals sig.csv --journal journal.csv --horizons 1 5 20
+
+SCHEMA_VERSION = 1
+HORIZONS = (1, 3, 5, 10, 20)
+FEATURES = ["VIX", "Nifty_Trend", "RVol", "RSI", "SMA200_Dist"]
+# Max |logged - as-of| before a row is flagged; the scanner logs intraday, so allow a little slack.
+# VIX, Nifty_Trend and RVol are not checked: they were read off intraday prints at signal time that
+# the daily history can't reproduce, so an as-of recompute would flag every row.
+LEAK_TOLERANCE = {"RSI": 1.0, "SMA200_Dist": 0.25}
+SMA_WINDOW, RSI_PERIOD = 200, 14
+
+def clean_signals(records):
+    df = pd.DataFrame(records)
+    if df.empty: return df
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    for col in FEATURES + ['Price']:
+        df[col] = pd.to_numeric(df.get(col), errors='coerce')
+    df = df.dropna(subset=['Date', 'Symbol', 'Price']).reset_index(drop=True)
+    df['Symbol'] = df['Symbol'].astype(str)
+    df['Ticker'] = df['Symbol'] + ".NS"
+    return df
+
+def attach_outcomes(signals, journal_records):
+    """Left-joins each signal to the trade (if any) the bot opened on that symbol that day."""
+    journal = pd.DataFrame(journal_records)
+    if journal.empty or 'Symbol' not in journal.columns:
+        signals['Traded'] = False
+        return signals
+    journal = journal.assign(
+        Date=pd.to_datetime(journal['Date'], errors='coerce'),
+        Symbol=journal['Symbol'].astype(str),
+        Realized_PnL=pd.to_numeric(journal['PnL'].astype(str).str.replace(r'[₹,a-zA-Z\s]', '', regex=True), errors='coerce'),
+    )[['Date', 'Symbol', 'Realized_PnL', 'Result']].drop_duplicates(subset=['Date', 'Symbol'], keep='last')
+    out = signals.merge(journal, on=['Date', 'Symbol'], how='left')
+    out['Traded'] = out['Result'].notna()
+    return out
+
+def load_price_history(tickers, start, end):
+    raw = yf.download(sorted(set(tickers)), start=start, end=end, threads=False, progress=False)
+    md = MarketData.from_download(raw)
+    if md.dates.tz is not None: md.dates = md.dates.tz_localize(None)
+    return md
+
+def ffill_closes(close):
+    """Row-wise forward fill of an N x T matrix (leading gaps stay NaN)."""
+    valid = ~np.isnan(close)
+    idx = np.where(valid, np.arange(close.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    filled = close[np.arange(close.shape[0])[:, None], idx]
+    filled[~np.maximum.accumulate(valid, axis=1)] = np.nan
+    return filled
+
+def locate_signals(md, signals):
+    """(row, col, ok) for every signal: the ticker row and the bar of the signal date."""
+    sym_idx = signals['Ticker'].map(md.pos).fillna(-1).to_numpy(dtype=np.int64)
+    dates = signals['Date'].dt.normalize().to_numpy(dtype='datetime64[ns]')
+    bar_dates = md.dates.normalize().to_numpy(dtype='datetime64[ns]')
+    t_idx = np.searchsorted(bar_dates, dates)
+    in_range = t_idx < len(bar_dates)
+    ok = (sym_idx >= 0) & in_range
+    ok[ok] = bar_dates[t_idx[ok]] == dates[ok]
+    return np.where(ok, sym_idx, 0), np.where(ok, t_idx, 0), ok
+
+def build_labels(close, rows, cols, ok, entry, horizons, stop_pct):
+    """Forward return (%) and stop-hit flag at every horizon, from one (S x max_h) gather."""
+    n_bars = close.shape[1]
+    steps = np.arange(1, max(horizons) + 1)
+    fwd_idx = cols[:, None] + steps
+    reachable = (fwd_idx < n_bars) & ok[:, None]
+    path = close[rows[:, None], np.minimum(fwd_idx, n_bars - 1)].astype(np.float64)
+    path[~reachable] = np.nan
+
+    stop_level = entry * (1 - stop_pct / 100)
+    # Daily closes only: a stop is 'hit' when a close after entry day finishes at/below it
+    hit = np.fmin.accumulate(path, axis=1) <= stop_level[:, None]
+    first_hit = np.where(hit.any(axis=1), hit.argmax(axis=1) + 1, np.nan)
+
+    labels = {}
+    for h in horizons:
+        live = reachable[:, h - 1]
+        labels[f"Fwd_Ret_{h}d"] = np.where(live, (path[:, h - 1] / entry - 1) * 100, np.nan)
+        labels[f"Hit_Stop_{h}d"] = np.where(live, hit[:, h - 1], np.nan)
+    labels["Days_To_Stop"] = np.where(first_hit <= max(horizons), first_hit, np.nan)
+    return labels
+
+def _window_sum(prefix, nan_prefix, rows, end, length):
+    """Sum of a row over bars [end - length, end) via prefix sums; NaN if the window is short or gappy."""
+    start = end - length
+    ok = start >= 0
+    start = np.maximum(start, 0)
+    total = prefix[rows, end] - prefix[rows, start]
+    gaps = nan_prefix[rows, end] - nan_prefix[rows, start]
+    return np.where(ok & (gaps == 0), total, np.nan)
+
+def asof_features(close, rows, cols, ok, price):
+    """RSI(14) and SMA200 distance exactly as the scanner saw them: prior closes + the logged print."""
+    nan_mask = np.isnan(close)
+    filled = np.where(nan_mask, 0.0, close).astype(np.float64)
+    pad = np.zeros((close.shape[0], 1))
+    prefix = np.concatenate([pad, np.cumsum(filled, axis=1)], axis=1)
+    nan_prefix = np.concatenate([pad, np.cumsum(nan_mask, axis=1)], axis=1)
+
+    sma_prior = _window_sum(prefix, nan_prefix, rows, cols, SMA_WINDOW - 1)
+    sma200 = (sma_prior + price) / SMA_WINDOW
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sma_dist = np.round((price - sma200) / sma200 * 100, 2)
+
+    delta = np.diff(close, axis=1, prepend=np.nan)
+    d_nan = np.isnan(delta)
+    d = np.where(d_nan, 0.0, delta)
+    g_prefix = np.concatenate([pad, np.cumsum(np.maximum(d, 0), axis=1)], axis=1)
+    l_prefix = np.concatenate([pad, np.cumsum(np.maximum(-d, 0), axis=1)], axis=1)
+    dn_prefix = np.concatenate([pad, np.cumsum(d_nan, axis=1)], axis=1)
+
+    prev_close = close[rows, np.maximum(cols - 1, 0)]
+    last = price - prev_close
+    gain = _window_sum(g_prefix, dn_prefix, rows, cols, RSI_PERIOD - 1) + np.maximum(last, 0)
+    loss = _window_sum(l_prefix, dn_prefix, rows, cols, RSI_PERIOD - 1) + np.maximum(-last, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.round(100 - (100 / (1 + gain / loss)), 2)
+
+    return {"RSI_AsOf": np.where(ok, rsi, np.nan), "SMA200_Dist_AsOf": np.where(ok, sma_dist, np.nan)}
+
+def build_dataset(signal_records, journal_records, horizons=HORIZONS, stop_pct=1.5, md=None):
+    signals = clean_signals(signal_records)
+    if signals.empty: return signals
+    if md is None:
+        start = signals['Date'].min() - pd.Timedelta(days=int(SMA_WINDOW * 1.6))
+        end = signals['Date'].max() + pd.Timedelta(days=int(max(horizons) * 1.6) + 5)
+        md = load_price_history(signals['Ticker'].unique().tolist(), start, end)
+
+    close = ffill_closes(md.close.astype(np.float64))
+    rows, cols, ok = locate_signals(md, signals)
+    entry = signals['Price'].to_numpy(dtype=np.float64)
+
+    out = signals.assign(Bar_Found=ok, **asof_features(close, rows, cols, ok, entry))
+    for feat, tol in LEAK_TOLERANCE.items():
+        out[f"Leak_{feat}"] = (out[feat] - out[f"{feat}_AsOf"]).abs() > tol
+    out = out.assign(**build_labels(close, rows, cols, ok, entry, horizons, stop_pct))
+    return attach_outcomes(out, journal_records)
+
+def write_versioned(df, out_dir, horizons, stop_pct):
+    """Writes <out_dir>/signals_v<schema>_<content-hash>.parquet and appends it to manifest.json (once per file)."""
+    os.makedirs(out_dir, exist_ok=True)
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()[:12]
+    path = os.path.join(out_dir, f"signals_v{SCHEMA_VERSION}_{digest}.parquet")
+
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    manifest = []
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f: manifest = json.load(f)
+    # Same content hash = same dataset: a re-run is a no-op rather than a duplicate version
+    if os.path.exists(path) and any(m.get("file") == os.path.basename(path) for m in manifest): return path
+
+    df.to_parquet(path, index=False)
+    manifest.append({
+        "file": os.path.basename(path), "schema_version": SCHEMA_VERSION, "rows": len(df),
+        "horizons": list(horizons), "stop_pct": stop_pct,
+        "created": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    with open(manifest_path, "w") as f: json.dump(manifest, f, indent=2)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the versioned ML training set from Signal_Log + Journal.")
+    parser.add_argument("--keyfile", help="Service-account JSON (default: .streamlit/secrets.toml)")
+    parser.add_argument("--signals", help="Signal_Log CSV export instead of reading the sheet")
+    parser.add_argument("--journal", help="Journal CSV export instead of reading the sheet")
+    parser.add_argument("--horizons", type=int, nargs="+", default=list(HORIZONS))
+    parser.add_argument("--stop-pct", type=float, default=1.5, help="Stop distance (%%) for the hit-stop label")
+    parser.add_argument("--out", default="feature_store")
+    args = parser.parse_args()
+
+    if args.signals:
+        signal_records = pd.read_csv(args.signals).to_dict("records")
+        journal_records = pd.read_csv(args.journal).to_dict("records") if args.journal else []
+    else:
+        client = authorize(load_credentials(args.keyfile))
+        signal_records, journal_records = read_tab(client, "Signal_Log"), read_tab(client, "Journal")
+
+    t0 = time.perf_counter()
+    df = build_dataset(signal_records, journal_records, args.horizons, args.stop_pct)
+    if df.empty:
+        print("No usable signals found.")
+        return
+    path = write_versioned(df, args.out, args.horizons, args.stop_pct)
+    print(f"Built {len(df)} rows ({int(df['Bar_Found'].sum())} matched to bars) in {time.perf_counter() - t0:.2f}s -> {path}")
+    for feat in LEAK_TOLERANCE:
+        print(f"  Leak check {feat}: {int(df[f'Leak_{feat}'].sum())} rows differ from the as-of recompute")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import time
+import threading
+
+import pandas as pd
+import numpy as np
+import yfinance as yf
+
+# --- COMPACT MARKET DATA ---
+# Only Close and Volume survive the download. Closes are float32 and volumes int64, both stored
+# ticker-major (N x T, C-contiguous) so every per-ticker row is a contiguous slice that pandas
+# can wrap without copying. One shared date index; one copy per process.
+
+class MarketData:
+    def __init__(self, dates, tickers, close, volume):
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.pos = {t: i for i, t in enumerate(self.tickers)}
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_download(cls, data):
+        if data is None or data.empty: return cls.empty()
+        closes, vols = data['Close'], data['Volume']
+        if isinstance(closes, pd.Series):
+            closes, vols = closes.to_frame(), vols.to_frame()
+        vols = vols.reindex(index=closes.index, columns=closes.columns)
+
+        # Drop bars where nothing printed (exchange holidays that leak in from the index feeds)
+        keep = closes.notna().any(axis=1).to_numpy()
+        close = np.ascontiguousarray(closes.to_numpy(dtype=np.float32)[keep].T)
+        volume = np.ascontiguousarray(np.nan_to_num(vols.to_numpy(dtype=np.float64)[keep], nan=0.0).astype(np.int64).T)
+        return cls(closes.index[keep], closes.columns, close, volume)
+
+    @classmethod
+    def empty(cls):
+        return cls(pd.DatetimeIndex([]), [], np.empty((0, 0), dtype=np.float32), np.empty((0, 0), dtype=np.int64))
+
+    @property
+    def is_empty(self):
+        return self.close.size == 0
+
+    def closes_frame(self):
+        """Zero-copy float32 DataFrame view (dates x tickers) for code that wants the wide layout."""
+        if self.is_empty: return pd.DataFrame()
+        return pd.DataFrame(self.close.T, index=self.dates, columns=self.tickers, copy=False)
+
+    def volumes_frame(self):
+        if self.is_empty: return pd.DataFrame()
+        return pd.DataFrame(self.volume.T, index=self.dates, columns=self.tickers, copy=False)
+
+    def series(self, ticker):
+        """(close, volume) Series for one ticker with missing bars removed. Views when the ticker has no gaps."""
+        i = self.pos.get(ticker)
+        if i is None: return pd.Series(dtype=np.float32), pd.Series(dtype=np.int64)
+        c, v = self.close[i], self.volume[i]
+        valid = ~np.isnan(c)
+        if not valid.all():
+            return pd.Series(c[valid], index=self.dates[valid]), pd.Series(v[valid], index=self.dates[valid])
+        return pd.Series(c, index=self.dates, copy=False), pd.Series(v, index=self.dates, copy=False)
+
+    def memory_report(self):
+        """Bytes held vs what the old float64 Close/Volume frames would cost for the same shape."""
+        index_bytes = self.dates.nbytes if len(self.dates) else 0
+        used = self.close.nbytes + self.volume.nbytes + index_bytes
+        legacy = self.close.size * 8 * 2 + index_bytes
+        return {
+            "Tickers": len(self.tickers), "Bars": len(self.dates),
+            "Close (float32)": self.close.nbytes, "Volume (int64)": self.volume.nbytes,
+            "Date Index": index_bytes, "Total": used, "float64 Equivalent": legacy,
+        }
+
+class MarketStore:
+    """Process-wide holder that refetches the universe at most once per `ttl` seconds."""
+
+    def __init__(self, tickers, ttl=60):
+        self.tickers = list(tickers)
+        self.ttl = ttl
+        self.data = MarketData.empty()
+        self.fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self.data.is_empty or time.monotonic() - self.fetched_at >= self.ttl:
+                raw = yf.download(self.tickers, period="1y", threads=False, progress=False)
+                self.data = MarketData.from_download(raw)
+                self.fetched_at = time.monotonic()
+            return self.data
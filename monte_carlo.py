@@ -0,0 +1,107 @@
+import time
+
+import pandas as pd
+import numpy as np
+
+# --- MONTE CARLO STRESS TEST ---
+# Bootstraps the closed-trade PnL distribution into many equity paths with batched NumPy sampling.
+# Trades are expressed in R (1R = the average losing trade), and each path risks `risk_per_trade`%
+# of current equity per trade, so the result scales with the sidebar risk setting.
+
+DD_PERCENTILES = (50, 90, 95, 99)
+
+def to_r_multiples(pnl):
+    pnl = np.asarray(pnl, dtype=np.float64)
+    losses = pnl[pnl < 0]
+    if losses.size == 0: return None
+    return pnl / np.abs(losses.mean())
+
+def simulate_equity(r_multiples, risk_per_trade, n_paths=100_000, horizon=100, ruin_dd=0.5, seed=None, batch=25_000):
+    """Drawdown percentiles, risk of ruin and ending-equity spread over `n_paths` resampled paths of `horizon` trades.
+
+    Ruin is a peak-to-trough drawdown of at least `ruin_dd`, the same measure as the drawdown percentiles.
+    """
+    rng = np.random.default_rng(seed)
+    r = np.asarray(r_multiples, dtype=np.float64)
+    # 🛡️ A single trade can't lose more than the whole account
+    log_growth = np.log1p(np.maximum(r * (risk_per_trade / 100), -0.999999))
+    ruin_level = np.log1p(-ruin_dd)
+
+    t0 = time.perf_counter()
+    max_dd = np.empty(n_paths)
+    final = np.empty(n_paths)
+    ruined = np.empty(n_paths, dtype=bool)
+    for start in range(0, n_paths, batch):
+        stop = min(start + batch, n_paths)
+        draws = rng.integers(0, len(r), size=(stop - start, horizon), dtype=np.int32)
+        log_eq = np.cumsum(log_growth[draws], axis=1)
+        peak = np.maximum.accumulate(np.maximum(log_eq, 0.0), axis=1)
+        worst = (log_eq - peak).min(axis=1)
+        max_dd[start:stop] = 1 - np.exp(worst)
+        final[start:stop] = np.exp(log_eq[:, -1])
+        ruined[start:stop] = worst <= ruin_level
+
+    return {
+        "paths": n_paths, "horizon": horizon,
+        "drawdown": {p: float(np.percentile(max_dd, p)) * 100 for p in DD_PERCENTILES},
+        "risk_of_ruin": float(ruined.mean()) * 100,
+        "final_equity": {p: (float(np.percentile(final, p)) - 1) * 100 for p in (5, 50, 95)},
+        "elapsed": time.perf_counter() - t0,
+    }
+
+def bootstrap_metrics(pnl, n_boot=10_000, ci=95, seed=None, batch_cells=2_000_000):
+    """Confidence intervals on win rate, avg winner/loser, reward-to-risk and expectancy."""
+    rng = np.random.default_rng(seed)
+    pnl = np.asarray(pnl, dtype=np.float64)
+    n = len(pnl)
+    # Each resample only needs (win count, win sum, total sum), so draws are made in row chunks
+    # of ~batch_cells and peak memory stays flat no matter how long the journal gets
+    chunk = max(1, batch_cells // max(n, 1))
+    n_wins = np.empty(n_boot)
+    win_sum = np.empty(n_boot)
+    total = np.empty(n_boot)
+    win_pnl = np.where(pnl > 0, pnl, 0.0)
+    for start in range(0, n_boot, chunk):
+        stop = min(start + chunk, n_boot)
+        draws = rng.integers(0, n, size=(stop - start, n), dtype=np.int32)
+        sample = pnl[draws]
+        n_wins[start:stop] = (sample > 0).sum(axis=1)
+        total[start:stop] = sample.sum(axis=1)
+        win_sum[start:stop] = win_pnl[draws].sum(axis=1)
+
+    n_losses = n - n_wins
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_win = win_sum / n_wins
+        avg_loss = (total - win_sum) / n_losses
+        boot = {
+            "Win Rate %": n_wins / n * 100,
+            "Avg Winner": avg_win,
+            "Avg Loser": avg_loss,
+            "Reward-to-Risk": np.abs(avg_win / avg_loss),
+            "Expectancy / Trade": total / n,
+        }
+
+    lo, hi = (100 - ci) / 2, 100 - (100 - ci) / 2
+    rows = []
+    for name, values in boot.items():
+        values = values[np.isfinite(values)]
+        if values.size == 0: rows.append({"Metric": name, "Median": np.nan, f"{lo:g}%": np.nan, f"{hi:g}%": np.nan})
+        else: rows.append({"Metric": name, "Median": np.median(values), f"{lo:g}%": np.percentile(values, lo), f"{hi:g}%": np.percentile(values, hi)})
+    return pd.DataFrame(rows)
+
+def simulate_buckets(trades, by, risk_per_trade, **kwargs):
+    """simulate_equity per bucket (e.g. Strategy or Time_Zone) on the trades' shared `R` column.
+
+    R must be scaled once over all trades: a per-bucket 1R would make buckets incomparable.
+    """
+    rows = []
+    for bucket, group in trades.groupby(by, observed=True):
+        r = group['R'].to_numpy(dtype=np.float64)
+        if len(r) < 2: continue
+        res = simulate_equity(r, risk_per_trade, **kwargs)
+        rows.append({
+            by: bucket, "Trades": len(r),
+            "Median DD %": res["drawdown"][50], "95th DD %": res["drawdown"][95],
+            "Risk of Ruin %": res["risk_of_ruin"], "Median Return %": res["final_equity"][50],
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,76 @@
+import pandas as pd
+import numpy as np
+
+# --- COLUMNAR PORTFOLIO BOOK ---
+# The open book is parsed once into NumPy arrays and every refresh values and manages
+# stops for all positions in a single vectorized pass (same rules as the old per-trade loop).
+
+RISK_FREE_PCT = 4.0
+TRAIL_TRIGGER_PCT = 6.0
+TRAIL_FACTOR = 0.96
+
+def build_book(portfolio):
+    """Parses the list-of-dicts portfolio into typed columns (done once, not per refresh)."""
+    return {
+        "symbol": np.array([str(t['Symbol']) for t in portfolio], dtype=object),
+        "ticker": np.array([str(t['Ticker']) for t in portfolio], dtype=object),
+        "date": np.array([str(t.get('Date')) for t in portfolio], dtype=object),
+        "qty": np.array([int(t['Qty']) for t in portfolio], dtype=np.int64),
+        "buy": np.array([float(t['BuyPrice']) for t in portfolio], dtype=np.float64),
+        "stop": np.array([float(t['StopPrice']) for t in portfolio], dtype=np.float64),
+    }
+
+def latest_prices(live_data, tickers):
+    """Last non-NaN print per ticker, aligned to the book. NaN where the feed has nothing."""
+    if live_data is None or len(live_data) == 0:
+        return np.full(len(tickers), np.nan)
+    if isinstance(live_data, pd.Series):
+        live_data = live_data.to_frame(tickers[0])
+    last = live_data.ffill().iloc[-1]
+    last = last[~last.index.duplicated()]
+    return pd.to_numeric(last.reindex(tickers), errors='coerce').to_numpy(dtype=np.float64)
+
+def value_book(book, prices):
+    """Valuation, risk-free promotion, 0.96 trail and stop-hit detection for every position at once."""
+    buy, qty, sl = book["buy"], book["qty"], book["stop"]
+
+    # 🛡️ API glitch: no live print -> hold at entry and freeze stop management for that row
+    glitch = np.isnan(prices)
+    price = np.where(glitch, buy, prices)
+
+    cur_val = price * qty
+    inv_val = buy * qty
+    pnl = cur_val - inv_val
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pnl_pct = (pnl / inv_val) * 100
+
+    live = ~glitch
+    msg = np.full(len(buy), "", dtype=object)
+
+    risk_free = live & (pnl_pct > RISK_FREE_PCT) & (sl < buy)
+    new_sl = np.where(risk_free, buy, sl)
+    msg[risk_free] = "🛡️ RISK FREE"
+
+    trail = np.round(price * TRAIL_FACTOR, 2)
+    trailing = live & (pnl_pct > TRAIL_TRIGGER_PCT) & (trail > new_sl)
+    new_sl = np.where(trailing, trail, new_sl)
+    msg[trailing] = "📈 TRAILING"
+
+    stop_hit = live & (price <= new_sl)
+    msg[stop_hit] = "❌ STOP HIT"
+
+    new_sl = np.where(live, np.round(new_sl, 2), sl)
+    return {
+        "price": price, "glitch": glitch, "cur_val": cur_val, "inv_val": inv_val,
+        "pnl": pnl, "pnl_pct": pnl_pct, "new_sl": new_sl, "msg": msg,
+        "stop_hit": stop_hit, "stop_moved": live & (new_sl != sl),
+    }
+
+def closed_trade_record(trade, price, pnl, now):
+    closed_trade = trade.copy()
+    closed_trade.update({
+        'ExitPrice': price, 'ExitDate': now.strftime("%Y-%m-%d"),
+        'ExitTime': now.strftime("%H:%M:%S"), 'PnL': pnl,
+        'Result': "WIN" if pnl > 0 else "LOSS"
+    })
+    return closed_trade
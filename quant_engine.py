@@ -0,0 +1,172 @@
+import datetime
+
+import pandas as pd
+
+# --- QUANT ENGINE ---
+# Pure indicator, market-gate and scanner math. Shared by the Streamlit terminal, the
+# Custom Watchlist Analyzer and the headless engine (engine.py), so it must never touch st.*.
+
+SWING_MODE = "🛡️ Swing (Sentinel)"
+SCALP_MODE = "🎯 Scalp (Sniper)"
+
+NIFTY_50 = ["ADANIENT", "ADANIPORTS", "APOLLOHOSP", "ASIANPAINT", "AXISBANK", "BAJAJ-AUTO", "BAJFINANCE", "BAJAJFINSV", "BEL", "BPCL", "BHARTIARTL", "BRITANNIA", "CIPLA", "COALINDIA", "DRREDDY", "EICHERMOT", "GRASIM", "HCLTECH", "HDFCBANK", "HDFCLIFE", "HEROMOTOCO", "HINDALCO", "HINDUNILVR", "ICICIBANK", "ITC", "INDUSINDBK", "INFY", "JSWSTEEL", "KOTAKBANK", "LT", "LTIM", "M&M", "MARUTI", "NTPC", "NESTLEIND", "ONGC", "POWERGRID", "RELIANCE", "SBILIFE", "SHRIRAMFIN", "SBIN", "SUNPHARMA", "TCS", "TATACONSUM", "TATAMOTORS", "TATASTEEL", "TECHM", "TITAN", "ULTRACEMCO", "WIPRO"]
+TICKERS = [f"{t}.NS" for t in NIFTY_50]
+INDEX_TICKERS = ["^NSEI", "^INDIAVIX"]
+
+BUY_STATUSES = ["🎯 CONFIRMED", "🚀 BREAKOUT", "✅ STRONG BUY"]
+
+# Sniper squeeze: 20-bar Bollinger width under 10% on daily bars. Band width grows with the square root
+# of bar length, so intraday timeframes scale it by sqrt(bar minutes / 375-minute NSE session).
+SQUEEZE_WIDTH_1D = 0.10
+TF_MINUTES = {"5m": 5, "15m": 15, "60m": 60, "1D": 375}
+
+def squeeze_width(tf):
+    return SQUEEZE_WIDTH_1D * (TF_MINUTES.get(tf, 375) / 375) ** 0.5
+
+def calculate_rsi(series, period=14):
+    delta = series.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+    rs = gain / loss
+    return 100 - (100 / (1 + rs))
+
+def calculate_bollinger_width(series, period=20):
+    sma = series.rolling(window=period).mean()
+    std = series.rolling(window=period).std()
+    return ((sma + (2 * std)) - (sma - (2 * std))) / sma
+
+def evaluate_setup(series, vol_series, mode, nifty_perf, is_safe_to_buy, squeeze=SQUEEZE_WIDTH_1D):
+    """Runs the strategy rules on one symbol. Returns (status, trigger_price, raw_technical_trigger)."""
+    curr_price = series.iloc[-1]
+    status, trigger_price = "⏳ WAIT", 0.0
+
+    # 🟢 Isolate raw mathematical trigger from market filter
+    raw_technical_trigger = False
+
+    if mode == SWING_MODE:
+        high_5d = series.tail(6).iloc[:-1].max()
+        sma200 = series.rolling(200).mean().iloc[-1]
+        if len(series) > 60: stock_perf = series.iloc[-1] / series.iloc[-60]
+        else: stock_perf = 0
+        trigger_price = high_5d
+
+        if curr_price > high_5d and curr_price > sma200 and stock_perf > nifty_perf:
+            raw_technical_trigger = True
+            if is_safe_to_buy: status = "🎯 CONFIRMED"
+            else: status = "⛔ MKT WEAK"
+    else:
+        bb_w = calculate_bollinger_width(series).iloc[-1]
+        rsi = calculate_rsi(series).iloc[-1]
+        vol_ma = vol_series.rolling(20).mean().iloc[-1]
+
+        if bb_w < squeeze: status = "👀 WATCH (Squeeze)"
+        elif (vol_series.iloc[-1] > vol_ma * 1.5) and rsi > 55:
+            raw_technical_trigger = True
+            if is_safe_to_buy:
+                status = "🚀 BREAKOUT"
+                trigger_price = curr_price
+            else:
+                status = "⛔ MKT WEAK"
+
+    return status, trigger_price, raw_technical_trigger
+
+def market_regime(closes):
+    """Nifty gate: 20 SMA trend + intraday bleed check, plus the VIX/perf inputs the scanner needs."""
+    regime = {"is_safe_to_buy": False, "intraday_pct": None, "nifty_perf": 0.0, "vix": 15.0, "status_msg": None}
+    if closes.empty or '^NSEI' not in closes.columns: return regime
+
+    nifty_closes = closes['^NSEI'].dropna()
+    if len(nifty_closes) > 20:
+        nifty_sma20 = nifty_closes.rolling(20).mean().iloc[-1]
+        nifty_curr = nifty_closes.iloc[-1]
+        nifty_prev = nifty_closes.iloc[-2]
+
+        intraday_pct = ((nifty_curr - nifty_prev) / nifty_prev) * 100
+        is_macro_bullish = nifty_curr > nifty_sma20
+        is_bleeding = intraday_pct < -0.3
+
+        regime["intraday_pct"] = intraday_pct
+        regime["is_safe_to_buy"] = is_macro_bullish and not is_bleeding
+
+        if is_bleeding:
+            regime["status_msg"] = f"🔴 CRITICAL: NIFTY BLEEDING ({intraday_pct:.2f}%). ALL BUYING HALTED."
+        elif not is_macro_bullish:
+            regime["status_msg"] = f"🔴 MARKET MOOD: BEARISH (Below 20 SMA). Buying Paused."
+        else:
+            regime["status_msg"] = f"🟢 MARKET MOOD: BULLISH (Up {intraday_pct:.2f}%)"
+
+    if len(nifty_closes) > 60:
+        regime["nifty_perf"] = nifty_closes.iloc[-1] / nifty_closes.iloc[-60]
+
+    try: regime["vix"] = round(float(closes['^INDIAVIX'].dropna().iloc[-1]), 2)
+    except: pass
+    return regime
+
+def scan_symbol(ticker, series, vol_series, mode, regime, setup=None, setup_tf="1D"):
+    """Scores one ticker and computes its AI features (used for both logging and buying). None if unpriced.
+
+    `setup` is an optional (close, volume) pair on the `setup_tf` timeframe; when it has enough bars the
+    setup rules run on it instead of the daily series. AI features always come from daily history.
+    """
+    if series.empty: return None
+    if pd.isna(series.iloc[-1]): return None
+    # Closes are stored as float32; prices tick in paise, so round back to a clean float for logs/sheets
+    curr_price = round(float(series.iloc[-1]), 2)
+
+    curr_vol = vol_series.iloc[-1]
+    vol_sma20 = vol_series.rolling(20).mean().iloc[-1]
+    if setup is not None and len(setup[0]) > 20: (setup_close, setup_vol), squeeze = setup, squeeze_width(setup_tf)
+    else: (setup_close, setup_vol), squeeze = (series, vol_series), SQUEEZE_WIDTH_1D
+    status, trigger_price, raw_technical_trigger = evaluate_setup(setup_close, setup_vol, mode, regime["nifty_perf"], regime["is_safe_to_buy"], squeeze)
+
+    # 🧠 AI FEATURES
+    intraday_pct = regime["intraday_pct"]
+    c_sma200 = series.rolling(200).mean().iloc[-1]
+    features = {
+        "VIX": regime["vix"],
+        "Nifty_Trend": round(float(intraday_pct), 2) if intraday_pct is not None else 0.0,
+        "RVol": round(float(curr_vol / vol_sma20), 2) if vol_sma20 > 0 else 1.0,
+        "RSI": round(float(calculate_rsi(series).iloc[-1]), 2),
+        "SMA200_Dist": round(float(((curr_price - c_sma200) / c_sma200) * 100), 2) if c_sma200 > 0 else 0.0,
+    }
+    return {
+        "symbol": ticker.replace(".NS", ""), "ticker": ticker, "price": curr_price,
+        "vol": curr_vol, "vol_sma20": vol_sma20, "status": status, "trigger": trigger_price,
+        "raw_trigger": raw_technical_trigger,
+        "gap_pct": ((curr_price - trigger_price) / trigger_price) * 100 if trigger_price > 0 else 0,
+        "features": features,
+    }
+
+def confirm_signal(sig, signal_time, now_time, is_safe_to_buy):
+    """Afternoon re-check of a morning signal. Returns the (possibly upgraded/downgraded) status."""
+    start_time_obj = datetime.datetime.strptime(signal_time, "%H:%M").time()
+    cutoff_start = datetime.time(10, 0)
+    cutoff_now = datetime.time(15, 0)
+
+    if now_time >= cutoff_now and start_time_obj <= cutoff_start:
+        # 🛡️ FATAL FLAW PATCH: Verify the stock didn't crash during the day
+        if sig["raw_trigger"]:
+            if sig["vol"] > sig["vol_sma20"]:
+                return "✅ STRONG BUY" if is_safe_to_buy else "⛔ MKT WEAK"
+            return "⚠️ LOW VOL"
+        return "❌ FAILED SETUP" # It spiked in the morning but died by the afternoon
+    return sig["status"]
+
+def scan_row(sig, status, signal_time):
+    vol_sma20 = sig["vol_sma20"]
+    return {
+        "Stock": sig["symbol"], "Status": status, "Signal Time": signal_time,
+        "Price": round(sig["price"], 2), "Entry": round(sig["trigger"], 2),
+        "Vol vs Avg": f"{(sig['vol']/vol_sma20)*100:.0f}%" if vol_sma20 > 0 else "0%",
+        "Gap %": f"{sig['gap_pct']:.1f}%"
+    }
+
+def new_trade_record(sig, now, mode, risk_per_trade):
+    curr_price = sig["price"]
+    return {
+        "Date": now.strftime("%Y-%m-%d"), "EntryTime": now.strftime("%H:%M:%S"),
+        "Symbol": sig["symbol"], "Ticker": sig["ticker"], "Qty": 1, "BuyPrice": curr_price,
+        "StopPrice": curr_price * (1 - (risk_per_trade/100)), "Strategy": mode,
+        # 🧠 SILENT AI FEATURES
+        **sig["features"]
+    }
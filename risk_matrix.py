@@ -0,0 +1,136 @@
+import threading
+from collections import Counter, deque
+
+import pandas as pd
+import numpy as np
+
+# --- CONCENTRATION RISK ENGINE ---
+# Rolling return-correlation matrix over the scan universe, maintained incrementally from
+# running sums (Σr and Σrrᵀ) so a new or revised bar costs O(N²) instead of a full rebuild.
+
+SECTOR_MAP = {
+    "AXISBANK": "Banks", "HDFCBANK": "Banks", "ICICIBANK": "Banks", "INDUSINDBK": "Banks", "KOTAKBANK": "Banks", "SBIN": "Banks",
+    "BAJFINANCE": "Financials", "BAJAJFINSV": "Financials", "HDFCLIFE": "Financials", "SBILIFE": "Financials", "SHRIRAMFIN": "Financials",
+    "HCLTECH": "IT", "INFY": "IT", "LTIM": "IT", "TCS": "IT", "TECHM": "IT", "WIPRO": "IT",
+    "BAJAJ-AUTO": "Auto", "EICHERMOT": "Auto", "HEROMOTOCO": "Auto", "M&M": "Auto", "MARUTI": "Auto", "TATAMOTORS": "Auto",
+    "BRITANNIA": "FMCG", "HINDUNILVR": "FMCG", "ITC": "FMCG", "NESTLEIND": "FMCG", "TATACONSUM": "FMCG",
+    "APOLLOHOSP": "Pharma & Health", "CIPLA": "Pharma & Health", "DRREDDY": "Pharma & Health", "SUNPHARMA": "Pharma & Health",
+    "BPCL": "Energy", "COALINDIA": "Energy", "ONGC": "Energy", "RELIANCE": "Energy",
+    "NTPC": "Power", "POWERGRID": "Power",
+    "ADANIENT": "Metals & Mining", "HINDALCO": "Metals & Mining", "JSWSTEEL": "Metals & Mining", "TATASTEEL": "Metals & Mining",
+    "GRASIM": "Materials", "ULTRACEMCO": "Materials", "ASIANPAINT": "Materials",
+    "BEL": "Capital Goods", "LT": "Capital Goods",
+    "ADANIPORTS": "Infrastructure", "BHARTIARTL": "Telecom", "TITAN": "Consumer",
+}
+
+def sector_of(ticker):
+    return SECTOR_MAP.get(str(ticker).replace(".NS", ""), "Other")
+
+class RollingCorrelation:
+    """Incrementally maintained correlation of daily returns over the last `window` bars."""
+
+    def __init__(self, tickers, window=60, resync_every=250):
+        self.tickers = list(tickers)
+        self.pos = {t: i for i, t in enumerate(self.tickers)}
+        self.sectors = np.array([sector_of(t) for t in self.tickers], dtype=object)
+        self.window = window
+        self.resync_every = resync_every
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        n = len(self.tickers)
+        self._rets = deque()
+        self._sum = np.zeros(n)
+        self._cross = np.zeros((n, n))
+        self._last_ts = None
+        self._last_close = None
+        self._prev_close = None
+        self._pushes = 0
+        self.corr = np.eye(n)
+
+    @staticmethod
+    def _ret(close_row, base_row):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = close_row / base_row - 1.0
+        # 🛡️ Missing prints count as a flat bar so one halted stock can't poison the matrix
+        return np.nan_to_num(r, nan=0.0, posinf=0.0, neginf=0.0)
+
+    def _push(self, close_row):
+        r = self._ret(close_row, self._last_close)
+        self._rets.append(r)
+        self._sum += r
+        self._cross += np.outer(r, r)
+        if len(self._rets) > self.window:
+            old = self._rets.popleft()
+            self._sum -= old
+            self._cross -= np.outer(old, old)
+        self._prev_close, self._last_close = self._last_close, close_row
+        self._pushes += 1
+        if self._pushes % self.resync_every == 0:
+            # Re-derive the running sums exactly to shed float drift from add/subtract
+            R = np.array(self._rets)
+            self._sum, self._cross = R.sum(axis=0), R.T @ R
+
+    def _revise(self, close_row):
+        # Today's bar is still forming: swap its return out rather than pushing a new one
+        old = self._rets[-1]
+        r = self._ret(close_row, self._prev_close)
+        self._sum += r - old
+        self._cross += np.outer(r, r) - np.outer(old, old)
+        self._rets[-1] = r
+        self._last_close = close_row
+
+    def _refresh(self):
+        n_obs = len(self._rets)
+        if n_obs < 2: return
+        mean = self._sum / n_obs
+        cov = self._cross / n_obs - np.outer(mean, mean)
+        sd = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(sd, sd)
+        corr = np.clip(np.nan_to_num(corr, nan=0.0), -1.0, 1.0)
+        np.fill_diagonal(corr, 1.0)
+        self.corr = corr
+
+    def update(self, closes):
+        """Feeds the latest daily closes (index = dates, columns ⊇ tickers). Only new/revised bars are touched."""
+        if closes is None or closes.empty: return
+        frame = closes.reindex(columns=self.tickers).ffill()
+        values = frame.to_numpy(dtype=np.float64)
+        with self._lock:
+            if self._last_ts is None or self._last_ts not in frame.index:
+                self._reset()
+                start = max(0, len(values) - self.window - 1)
+                self._last_close = values[start]
+                for row in values[start + 1:]: self._push(row)
+            else:
+                at = frame.index.get_loc(self._last_ts)
+                if len(self._rets) > 0 and not np.array_equal(values[at], self._last_close, equal_nan=True):
+                    self._revise(values[at])
+                for row in values[at + 1:]: self._push(row)
+            self._last_ts = frame.index[-1]
+            self._refresh()
+
+    def exposure(self, ticker, held_tickers):
+        """(avg corr, max corr, same-sector count) of a candidate against the open book."""
+        i = self.pos.get(ticker)
+        held = [self.pos[t] for t in held_tickers if t in self.pos and t != ticker]
+        sector = self.sectors[i] if i is not None else sector_of(ticker)
+        same_sector = Counter(sector_of(t) for t in held_tickers if t != ticker)[sector]
+        if i is None or not held:
+            return 0.0, 0.0, same_sector
+        row = self.corr[i, held]
+        return float(row.mean()), float(row.max()), same_sector
+
+    def check_entry(self, ticker, held_tickers, max_avg_corr=0.6, max_per_sector=3):
+        """Returns (allowed, reason) for a pre-buy concentration gate."""
+        avg_corr, max_corr, same_sector = self.exposure(ticker, held_tickers)
+        if same_sector >= max_per_sector:
+            return False, f"{same_sector} open in {sector_of(ticker)}"
+        if avg_corr > max_avg_corr:
+            return False, f"avg corr {avg_corr:.2f} with book"
+        return True, ""
+
+    def sector_exposure(self, held_tickers):
+        return pd.Series(Counter(sector_of(t) for t in held_tickers), dtype=int).sort_values(ascending=False)
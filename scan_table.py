@@ -0,0 +1,81 @@
+import pandas as pd
+import numpy as np
+
+# --- SCANNER TABLE ENGINE ---
+# The scanner output is kept as a persistent table keyed by Stock. Each refresh is
+# diffed against the previous cycle so only rows that actually moved get rewritten.
+
+SCAN_COLUMNS = ["Stock", "Status", "Signal Time", "Price", "Entry", "Vol vs Avg", "Gap %"]
+
+STATUS_SORT = {"✅ STRONG BUY": 0, "🎯 CONFIRMED": 1, "🚀 BREAKOUT": 1, "⚠️ LOW VOL": 2, "⛔ MKT WEAK": 3, "👀 WATCH (Squeeze)": 4, "⏳ WAIT": 5}
+
+STATUS_STYLES = {
+    "✅ STRONG BUY": "background-color: #d4edda; color: #155724",
+    "⛔ MKT WEAK": "background-color: #f8d7da; color: #721c24",
+    "⚠️ LOW VOL": "background-color: #fff3cd; color: #856404",
+}
+
+def build_scan_frame(scan_results):
+    """Turns the raw scanner rows into a table keyed (and deduplicated) by Stock."""
+    df = pd.DataFrame(scan_results, columns=SCAN_COLUMNS)
+    df = df.drop_duplicates(subset='Stock', keep='last')
+    return df.set_index('Stock', drop=False)
+
+def diff_scan(prev, curr):
+    """Returns (changed_keys, removed_keys) between two keyed scan tables."""
+    if prev is None or prev.empty:
+        return curr.index, pd.Index([])
+    removed = prev.index.difference(curr.index)
+    shared = curr.index.intersection(prev.index)
+    added = curr.index.difference(prev.index)
+
+    a = curr.loc[shared, SCAN_COLUMNS]
+    b = prev.loc[shared, SCAN_COLUMNS]
+    # 🛡️ Compare column-wise in one pass; NaN == NaN counts as unchanged
+    moved = ((a != b) & ~(a.isna() & b.isna())).any(axis=1)
+    return added.append(shared[moved.to_numpy()]), removed
+
+def apply_scan_diff(table, curr, changed, removed):
+    """Patches only the changed/removed rows into the persistent table, then re-sorts."""
+    if table is None or table.empty:
+        table = curr.copy()
+    else:
+        table = table.drop(index=removed)
+        if len(changed) > 0:
+            table = pd.concat([table.drop(index=table.index.intersection(changed)), curr.loc[changed]])
+    sort_key = table['Status'].map(STATUS_SORT).fillna(len(STATUS_SORT))
+    order = np.lexsort((table['Stock'].to_numpy(), sort_key.to_numpy()))
+    return table.iloc[order]
+
+def describe_changes(prev, curr, changed, removed, stamp):
+    """Compact 'what moved' feed: status flips, new rows and drops (price-only ticks are counted, not listed).
+
+    With no previous table (first cycle, mode switch) every row is 'new', so that is one rebuild line.
+    """
+    if prev is None or prev.empty:
+        return [f"🔄 {stamp} - Table rebuilt ({len(curr)} rows)"], 0
+    feed = []
+    price_only = 0
+    for sym in changed:
+        new_status = curr.at[sym, 'Status']
+        if sym not in prev.index:
+            feed.append(f"🆕 {stamp} - {sym}: {new_status} @ ₹{curr.at[sym, 'Price']:.2f}")
+            continue
+        old_status = prev.at[sym, 'Status']
+        if old_status != new_status:
+            feed.append(f"🔁 {stamp} - {sym}: {old_status} → {new_status} @ ₹{curr.at[sym, 'Price']:.2f}")
+        else:
+            price_only += 1
+    for sym in removed:
+        feed.append(f"➖ {stamp} - {sym}: dropped from scan")
+    return feed, price_only
+
+def style_scan(df):
+    """Vectorized row highlighting: one Status→CSS map broadcast across all columns."""
+    row_css = df['Status'].map(STATUS_STYLES).fillna('').to_numpy()
+
+    def _paint(frame):
+        css = np.repeat(row_css[df.index.get_indexer(frame.index)][:, None], frame.shape[1], axis=1)
+        return pd.DataFrame(css, index=frame.index, columns=frame.columns)
+
+    return df.style.apply(_paint, axis=None)
@@ -0,0 +1,102 @@
+import datetime
+import json
+import tomllib
+
+import pandas as pd
+import gspread
+from oauth2client.service_account import ServiceAccountCredentials
+
+# --- GOOGLE SHEETS STORE ---
+# Raw reads/writes against Swing_Trading_DB. No Streamlit here: the terminal wraps these with its
+# session-state connection flag, and the headless engine calls them directly.
+
+DB_NAME = "Swing_Trading_DB"
+SCOPE = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+
+PORTFOLIO_HEADERS = ["Date", "EntryTime", "Symbol", "Ticker", "Qty", "BuyPrice", "StopPrice", "Strategy", "VIX", "Nifty_Trend", "RVol", "RSI", "SMA200_Dist"]
+JOURNAL_HEADERS = ["Date", "EntryTime", "Symbol", "Ticker", "Qty", "BuyPrice", "ExitPrice", "ExitDate", "ExitTime", "PnL", "Result", "Strategy", "VIX", "Nifty_Trend", "RVol", "RSI", "SMA200_Dist"]
+SIGNAL_HEADERS = ["Date", "Symbol", "Time", "Status", "Nifty_Trend", "VIX", "RVol", "RSI", "SMA200_Dist", "Price"]
+ENGINE_HEADERS = ["Heartbeat", "Cycle", "Cycle_ms", "Mode", "Sniper_TF", "Open_Positions", "Status"]
+
+# Headless engine counts as live while its last heartbeat is younger than this
+ENGINE_STALE_AFTER = datetime.timedelta(minutes=2)
+
+def load_credentials(keyfile=None):
+    """Service-account dict for the CLI tools: a JSON keyfile, else the terminal's .streamlit/secrets.toml."""
+    if keyfile:
+        with open(keyfile) as f: return json.load(f)
+    with open(".streamlit/secrets.toml", "rb") as f:
+        return dict(tomllib.load(f)["gcp_service_account"])
+
+def authorize(keyfile_dict):
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(keyfile_dict, SCOPE)
+    return gspread.authorize(creds)
+
+def worksheet(client, tab_name):
+    return client.open(DB_NAME).worksheet(tab_name)
+
+def read_tab(client, tab_name):
+    return worksheet(client, tab_name).get_all_records()
+
+def write_portfolio(client, data):
+    sheet = worksheet(client, "Portfolio")
+    if len(data) > 0:
+        df = pd.DataFrame(data)
+        # 🛡️ BUG FIX: Sanitize missing legacy data so Google Sheets doesn't crash
+        df = df.fillna("")
+        write_data = [df.columns.values.tolist()] + df.values.tolist()
+    else:
+        # 🟢 AI UPGRADE: Added AI Feature headers to fallback empty portfolio
+        write_data = [PORTFOLIO_HEADERS]
+    sheet.clear()
+    sheet.update(write_data)
+
+def append_journal(client, trade):
+    # 🟢 AI UPGRADE: Inject the 5 new Market Context features into the Journal row
+    row = [
+        trade.get("Date", ""), trade.get("EntryTime", ""), trade.get("Symbol", ""), trade.get("Ticker", ""),
+        trade.get("Qty", 0), trade.get("BuyPrice", 0.0), trade.get("ExitPrice", 0.0),
+        trade.get("ExitDate", ""), trade.get("ExitTime", ""), trade.get("PnL", 0.0), trade.get("Result", ""),
+        trade.get("Strategy", ""), trade.get("VIX", 0.0), trade.get("Nifty_Trend", 0.0),
+        trade.get("RVol", 0.0), trade.get("RSI", 0.0), trade.get("SMA200_Dist", 0.0)
+    ]
+    sheet = worksheet(client, "Journal")
+    if not sheet.row_values(1):
+        sheet.append_row(JOURNAL_HEADERS)
+    sheet.append_row(row)
+
+def append_signal(client, date_str, symbol, signal_time, status, nifty_trend, vix, rvol, rsi, sma200_dist, price):
+    sheet = worksheet(client, "Signal_Log")
+    if not sheet.row_values(1):
+        sheet.append_row(SIGNAL_HEADERS)
+    # 🟢 THE FINAL LOCK: Securing the exact execution price for next month's AI simulation
+    sheet.append_row([date_str, symbol, signal_time, status, nifty_trend, vix, rvol, rsi, sma200_dist, price])
+
+def signals_for_day(records, date_str):
+    history = {}
+    if records:
+        df = pd.DataFrame(records)
+        if not df.empty and 'Date' in df.columns:
+            today_data = df[df['Date'] == date_str]
+            for _, row in today_data.iterrows():
+                history[row['Symbol']] = row['Time']
+    return history
+
+def write_heartbeat(client, heartbeat, cycle, cycle_ms, mode, sniper_tf, open_positions, status):
+    try: sheet = worksheet(client, "Engine")
+    except gspread.exceptions.WorksheetNotFound:
+        sheet = client.open(DB_NAME).add_worksheet(title="Engine", rows=2, cols=len(ENGINE_HEADERS))
+    # Tabs created before Sniper_TF existed are one column short
+    if sheet.col_count < len(ENGINE_HEADERS): sheet.add_cols(len(ENGINE_HEADERS) - sheet.col_count)
+    sheet.update([ENGINE_HEADERS, [heartbeat, cycle, cycle_ms, mode, sniper_tf, open_positions, status]])
+
+def read_heartbeat(client):
+    rows = read_tab(client, "Engine")
+    return rows[0] if rows else None
+
+def engine_is_live(heartbeat, now):
+    """True if the headless engine wrote a heartbeat recently (naive IST timestamps on both sides)."""
+    if not heartbeat: return False
+    try: beat = datetime.datetime.strptime(str(heartbeat.get("Heartbeat")), "%Y-%m-%d %H:%M:%S")
+    except ValueError: return False
+    return (now.replace(tzinfo=None) - beat) < ENGINE_STALE_AFTER
@@ -5,10 +5,16 @@ import numpy as np
 import datetime
 import pytz
 import time
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from streamlit_autorefresh import st_autorefresh
 from analysis import run_advanced_audit
+from scan_table import build_scan_frame, diff_scan, apply_scan_diff, describe_changes, style_scan
+from quant_engine import SWING_MODE, SCALP_MODE, TICKERS, INDEX_TICKERS, BUY_STATUSES, calculate_rsi, evaluate_setup, market_regime, scan_symbol, confirm_signal, scan_row, new_trade_record
+from ttl_cache import TTLCache
+from portfolio_book import build_book, latest_prices, value_book, closed_trade_record
+from sheets_store import authorize, read_tab, write_portfolio, append_journal, append_signal, signals_for_day, read_heartbeat, engine_is_live
+from risk_matrix import RollingCorrelation
+from market_data import MarketData, MarketStore
+from bars import IntradayFeed
 
 # --- 1. SYSTEM CONFIGURATION ---
 st.set_page_config(page_title="Elite Quant Terminal", layout="wide")
@@ -32,11 +38,7 @@ if 'db_connected' not in st.session_state: st.session_state.db_connected = False
 
 @st.cache_resource
 def init_google_sheet():
-    try:
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(st.secrets["gcp_service_account"], scope)
-        client = gspread.authorize(creds)
-        return client
+    try: return authorize(st.secrets["gcp_service_account"])
     except: return None
 
 def fetch_sheet_data(tab_name):
@@ -44,7 +46,7 @@ def fetch_sheet_data(tab_name):
         client = init_google_sheet()
         if client: 
             st.session_state.db_connected = True 
-            return client.open("Swing_Trading_DB").worksheet(tab_name).get_all_records()
+            return read_tab(client, tab_name)
     except: 
         st.session_state.db_connected = False 
         return []
@@ -55,40 +57,16 @@ def save_portfolio_cloud(data):
     if data is None: return
     try:
         client = init_google_sheet()
-        if client:
-            sheet = client.open("Swing_Trading_DB").worksheet("Portfolio")
-            if len(data) > 0:
-                df = pd.DataFrame(data)
-                # 🛡️ BUG FIX: Sanitize missing legacy data so Google Sheets doesn't crash
-                df = df.fillna("") 
-                write_data = [df.columns.values.tolist()] + df.values.tolist()
-            else:
-                # 🟢 AI UPGRADE: Added AI Feature headers to fallback empty portfolio
-                write_data = [["Date", "EntryTime", "Symbol", "Ticker", "Qty", "BuyPrice", "StopPrice", "Strategy", "VIX", "Nifty_Trend", "RVol", "RSI", "SMA200_Dist"]]
-            sheet.clear()
-            sheet.update(write_data)
+        if client: write_portfolio(client, data)
     except Exception as e:
         print(f"Cloud Save Error: {e}")
 
 def log_trade_journal(trade):
     if not st.session_state.db_connected: return False
-    # 🟢 AI UPGRADE: Inject the 5 new Market Context features into the Journal row
-    row = [
-        trade.get("Date", ""), trade.get("EntryTime", ""), trade.get("Symbol", ""), trade.get("Ticker", ""),
-        trade.get("Qty", 0), trade.get("BuyPrice", 0.0), trade.get("ExitPrice", 0.0),
-        trade.get("ExitDate", ""), trade.get("ExitTime", ""), trade.get("PnL", 0.0), trade.get("Result", ""),
-        trade.get("Strategy", ""), trade.get("VIX", 0.0), trade.get("Nifty_Trend", 0.0),
-        trade.get("RVol", 0.0), trade.get("RSI", 0.0), trade.get("SMA200_Dist", 0.0)
-    ]
     try:
         client = init_google_sheet()
         if client:
-            sheet = client.open("Swing_Trading_DB").worksheet("Journal")
-            if not sheet.row_values(1):
-                # 🟢 AI UPGRADE: Expand Journal headers
-                headers = ["Date", "EntryTime", "Symbol", "Ticker", "Qty", "BuyPrice", "ExitPrice", "ExitDate", "ExitTime", "PnL", "Result", "Strategy", "VIX", "Nifty_Trend", "RVol", "RSI", "SMA200_Dist"]
-                sheet.append_row(headers)
-            sheet.append_row(row)
+            append_journal(client, trade)
             return True
     except: return False
 
@@ -98,49 +76,84 @@ def log_signal_cloud(symbol, signal_time, status, nifty_trend, vix, rvol, rsi, s
         try:
             client = init_google_sheet()
             if client:
-                sheet = client.open("Swing_Trading_DB").worksheet("Signal_Log")
-                if not sheet.row_values(1):
-                    headers = ["Date", "Symbol", "Time", "Status", "Nifty_Trend", "VIX", "RVol", "RSI", "SMA200_Dist", "Price"]
-                    sheet.append_row(headers)
-                # 🟢 THE FINAL LOCK: Securing the exact execution price for next month's AI simulation
-                sheet.append_row([today_str, symbol, signal_time, status, nifty_trend, vix, rvol, rsi, sma200_dist, price])
+                append_signal(client, today_str, symbol, signal_time, status, nifty_trend, vix, rvol, rsi, sma200_dist, price)
                 return True 
         except: time.sleep(1) 
     return False
 
 def load_signals_from_cloud():
-    history = {}
+    try: return signals_for_day(fetch_sheet_data("Signal_Log"), today_str)
+    except: return {}
+
+@st.cache_data(ttl=15)
+def fetch_engine_heartbeat():
+    try:
+        client = init_google_sheet()
+        if client: return read_heartbeat(client)
+    except: pass
+    return None
+
+@st.cache_data(ttl=15)
+def fetch_engine_snapshot(day):
+    # 🛰️ Shared across viewers and reruns, so a room full of open tabs can't burn the Sheets read quota
     try:
-        data = fetch_sheet_data("Signal_Log")
-        if data:
-            df = pd.DataFrame(data)
-            if not df.empty and 'Date' in df.columns:
-                today_data = df[df['Date'] == today_str]
-                for _, row in today_data.iterrows():
-                    history[row['Symbol']] = row['Time']
+        client = init_google_sheet()
+        if client: return read_tab(client, "Portfolio"), read_tab(client, "Journal"), signals_for_day(read_tab(client, "Signal_Log"), day)
     except: pass
-    return history
+    return None
 
 # --- 3. SESSION STATE ---
 if 'portfolio' not in st.session_state: st.session_state.portfolio = fetch_sheet_data("Portfolio")
 if 'journal' not in st.session_state: st.session_state.journal = fetch_sheet_data("Journal")
 if 'blacklist' not in st.session_state: st.session_state.blacklist = []
 if 'notifications' not in st.session_state: st.session_state.notifications = []
+if 'gate_blocked' not in st.session_state: st.session_state.gate_blocked = []
+if 'scan_table' not in st.session_state:
+    st.session_state.scan_table = None
+    st.session_state.scan_styled = None
+    st.session_state.scan_view_key = None
+    st.session_state.scan_mode_key = None
+    st.session_state.scan_changes = []
+    st.session_state.scan_price_ticks = 0
 
 if 'last_run_date' not in st.session_state or st.session_state.last_run_date != today_str:
     st.session_state.last_run_date = today_str
     st.session_state.signal_history = load_signals_from_cloud()
     st.session_state.blacklist = []
     st.session_state.notifications = []
+    st.session_state.scan_changes = []
+    st.session_state.gate_blocked = []
+
+# 🛰️ HEADLESS ENGINE: While engine.py is heartbeating, this page is a read-only viewer of the store
+engine_beat = fetch_engine_heartbeat()
+engine_live = engine_is_live(engine_beat, now)
+if engine_live:
+    snapshot = fetch_engine_snapshot(today_str)
+    if snapshot: st.session_state.portfolio, st.session_state.journal, st.session_state.signal_history = snapshot
 
 # --- 4. SIDEBAR & NOTIFICATIONS ---
 with st.sidebar:
     st.header("⚙️ Control Panel")
-    mode = st.radio("Strategy Mode:", ["🛡️ Swing (Sentinel)", "🎯 Scalp (Sniper)"])
+    mode_options, tf_options = [SWING_MODE, SCALP_MODE], ["15m", "5m", "60m", "1D"]
+    if engine_live:
+        # 🛰️ Mirror the engine's settings so the scanner shows the signals it is actually acting on
+        mode = engine_beat.get('Mode') if engine_beat.get('Mode') in mode_options else SWING_MODE
+        engine_tf = str(engine_beat.get('Sniper_TF') or "15m")
+        sniper_tf = (engine_tf if engine_tf in tf_options else "15m") if mode == SCALP_MODE else "1D"
+        st.radio("Strategy Mode:", mode_options, index=mode_options.index(mode), disabled=True, key="engine_mode_view")
+        if mode == SCALP_MODE: st.caption(f"Sniper Timeframe: {sniper_tf} (set by engine)")
+    else:
+        mode = st.radio("Strategy Mode:", mode_options)
+        if mode == SCALP_MODE:
+            sniper_tf = st.selectbox("Sniper Timeframe", tf_options, help="Bars resampled locally from one 1-minute feed")
+        else: sniper_tf = "1D"
     st.divider()
     
     st.subheader("🤖 Auto-Bot")
-    if st.session_state.db_connected:
+    if engine_live:
+        st.success(f"🛰️ Headless Engine LIVE in {mode} ({engine_beat.get('Heartbeat')}, {engine_beat.get('Cycle_ms')} ms/cycle). Viewer is read-only.")
+        bot_active, auto_sell = False, False
+    elif st.session_state.db_connected:
         bot_active = st.checkbox("Enable Auto-Buying", value=True)
         auto_sell = st.checkbox("Enable Auto-Sell-Off", value=True, help="Automatically sells when SL is hit")
     else:
@@ -148,6 +161,9 @@ with st.sidebar:
         bot_active, auto_sell = False, False
         
     risk_per_trade = st.slider("Risk Per Trade (%)", 0.5, 5.0, 1.5)
+    gate_concentration = st.checkbox("Concentration Gate", value=True, help="Blocks entries that pile onto one sector or a highly correlated book")
+    max_per_sector = st.slider("Max Positions / Sector", 1, 10, 3)
+    max_avg_corr = st.slider("Max Avg Correlation (60d)", 0.3, 1.0, 0.6)
     
     st.divider()
     st.subheader("🔔 Notification Log")
@@ -162,7 +178,7 @@ with st.sidebar:
         st.rerun()
         
     st.divider()
-    if st.button("💾 Force Save to Cloud"):
+    if st.button("💾 Force Save to Cloud", disabled=engine_live):
         save_portfolio_cloud(st.session_state.portfolio)
         if st.session_state.db_connected: st.success("Synced!")
         
@@ -174,6 +190,7 @@ with st.sidebar:
 
     with st.expander("🔧 Diagnostics"):
         show_all = st.checkbox("Show 'WAIT' Stocks", value=True) 
+        mem_placeholder = st.empty()
         if st.button("Test DB Connection"):
             if init_google_sheet(): 
                 st.session_state.db_connected = True
@@ -183,55 +200,64 @@ with st.sidebar:
                 st.error("❌ Failed")
 
 # --- 5. INDICATORS & MARKET DATA ---
-def calculate_rsi(series, period=14):
-    delta = series.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-    rs = gain / loss
-    return 100 - (100 / (1 + rs))
-
-def calculate_bollinger_width(series, period=20):
-    sma = series.rolling(window=period).mean()
-    std = series.rolling(window=period).std()
-    return ((sma + (2 * std)) - (sma - (2 * std))) / sma
-
-NIFTY_50 = ["ADANIENT", "ADANIPORTS", "APOLLOHOSP", "ASIANPAINT", "AXISBANK", "BAJAJ-AUTO", "BAJFINANCE", "BAJAJFINSV", "BEL", "BPCL", "BHARTIARTL", "BRITANNIA", "CIPLA", "COALINDIA", "DRREDDY", "EICHERMOT", "GRASIM", "HCLTECH", "HDFCBANK", "HDFCLIFE", "HEROMOTOCO", "HINDALCO", "HINDUNILVR", "ICICIBANK", "ITC", "INDUSINDBK", "INFY", "JSWSTEEL", "KOTAKBANK", "LT", "LTIM", "M&M", "MARUTI", "NTPC", "NESTLEIND", "ONGC", "POWERGRID", "RELIANCE", "SBILIFE", "SHRIRAMFIN", "SBIN", "SUNPHARMA", "TCS", "TATACONSUM", "TATAMOTORS", "TATASTEEL", "TECHM", "TITAN", "ULTRACEMCO", "WIPRO"]
-TICKERS = [f"{t}.NS" for t in NIFTY_50]
-
-@st.cache_data(ttl=60)
+@st.cache_resource
+def get_market_store():
+    # 🟢 AI UPGRADE: Appended ^INDIAVIX to pull the Fear Gauge
+    # ⚡ One compact float32/int copy per process instead of pickled float64 frames per cache hit
+    return MarketStore(TICKERS + INDEX_TICKERS, ttl=60)
+
 def get_market_data():
     try:
-        if now.time() < datetime.time(9, 0): return pd.DataFrame(), pd.DataFrame()
-        # 🟢 AI UPGRADE: Appended ^INDIAVIX to pull the Fear Gauge
-        data = yf.download(TICKERS + ["^NSEI", "^INDIAVIX"], period="1y", threads=False, progress=False)
-        return data['Close'], data['Volume']
-    except: return pd.DataFrame(), pd.DataFrame()
-
-closes, volumes = get_market_data()
-
-is_safe_to_buy = False 
-market_status_msg = "⚪ MARKET DATA LOADING..."
-
-if not closes.empty and '^NSEI' in closes.columns:
-    nifty_closes = closes['^NSEI'].dropna()
-    if len(nifty_closes) > 20:
-        nifty_sma20 = nifty_closes.rolling(20).mean().iloc[-1]
-        nifty_curr = nifty_closes.iloc[-1]
-        nifty_prev = nifty_closes.iloc[-2]
-        
-        intraday_pct = ((nifty_curr - nifty_prev) / nifty_prev) * 100
-        is_macro_bullish = nifty_curr > nifty_sma20
-        is_bleeding = intraday_pct < -0.3
-        
-        is_safe_to_buy = is_macro_bullish and not is_bleeding
-        
-        if is_bleeding:
-            market_status_msg = f"🔴 CRITICAL: NIFTY BLEEDING ({intraday_pct:.2f}%). ALL BUYING HALTED."
-        elif not is_macro_bullish:
-            market_status_msg = f"🔴 MARKET MOOD: BEARISH (Below 20 SMA). Buying Paused."
-        else:
-            market_status_msg = f"🟢 MARKET MOOD: BULLISH (Up {intraday_pct:.2f}%)"
-else:
+        if now.time() < datetime.time(9, 0): return MarketData.empty()
+        return get_market_store().get()
+    except: return MarketData.empty()
+
+@st.cache_resource
+def get_watchlist_cache():
+    # 🟢 Process-wide LRU keyed by (symbol, mode); entries expire with the market data TTL
+    return TTLCache(maxsize=256, ttl=60)
+
+def fetch_watchlist_data(tickers):
+    data = yf.download(tickers, period="1y", progress=False, threads=False)
+    if data.empty: return pd.DataFrame(), pd.DataFrame()
+    w_closes, w_vols = data['Close'], data['Volume']
+    if isinstance(w_closes, pd.Series):
+        w_closes, w_vols = w_closes.to_frame(tickers[0]), w_vols.to_frame(tickers[0])
+    return w_closes, w_vols
+
+@st.cache_resource
+def get_intraday_feed():
+    # 🕐 One shared 1-minute stream; 5m/15m/60m + today's daily bar are resampled from it locally
+    return IntradayFeed(ttl=25)
+
+def get_intraday_bars(tickers):
+    if not tickers: return None
+    try: return get_intraday_feed().get(tickers)
+    except: return None
+
+@st.cache_resource
+def get_risk_matrix():
+    # 🧱 Shared rolling correlation over the universe; updated in place as new bars arrive
+    return RollingCorrelation(TICKERS, window=60)
+
+market_data = get_market_data()
+closes = market_data.closes_frame()
+
+mem = market_data.memory_report()
+mem_placeholder.caption(f"📦 Market Data: {mem['Tickers']} tickers × {mem['Bars']} bars = {mem['Total']/1024:,.1f} KB (float64 frames: {mem['float64 Equivalent']/1024:,.1f} KB)")
+risk_matrix = get_risk_matrix()
+if not closes.empty: risk_matrix.update(closes)
+
+regime = market_regime(closes)
+# Scalp setups come off the 1m feed: resampled intraday bars, or today's partial bar on top of the daily history for '1D'
+sniper_feed = mode == SCALP_MODE
+intraday_universe = (TICKERS if sniper_feed else []) + [p['Ticker'] for p in st.session_state.portfolio]
+intraday_bars = get_intraday_bars(intraday_universe)
+is_safe_to_buy = regime["is_safe_to_buy"]
+nifty_perf = regime["nifty_perf"]
+market_status_msg = regime["status_msg"] or "⚪ MARKET DATA LOADING..."
+
+if closes.empty or '^NSEI' not in closes.columns:
     if now.time() < datetime.time(9, 15): market_status_msg = "🌙 PRE-MARKET: Waiting for 9:15 AM..."
     else: market_status_msg = "⚠️ NIFTY DATA ERROR (Running Safe Mode)"
 
@@ -272,67 +298,64 @@ with tab1:
     try:
         scan_results = []
         new_trades_added = False
-        nifty_perf = 0.0
-        if not closes.empty and '^NSEI' in closes.columns:
-             nifty_closes = closes['^NSEI'].dropna()
-             if not nifty_closes.empty and len(nifty_closes) > 60:
-                nifty_perf = nifty_closes.iloc[-1] / nifty_closes.iloc[-60]
-                 # --- 🟢 NEW: CUSTOM WATCHLIST ANALYZER ---
+        # --- 🟢 NEW: CUSTOM WATCHLIST ANALYZER ---
         st.markdown("### 🔍 Custom Watchlist Analyzer")
-        c_input = st.text_input("Type any NSE Ticker to test the math (e.g., ZOMATO, RVNL, SUZLON):", "").strip().upper()
+        c_input = st.text_input("Type NSE Tickers to test the math, comma-separated (e.g., ZOMATO, RVNL, SUZLON):", "").strip().upper()
         
         if c_input:
-            custom_sym = c_input.replace('.NS', '')
-            custom_ticker = f"{custom_sym}.NS"
-            with st.spinner(f"Running quant engine on {custom_sym}..."):
-                try:
-                    c_data = yf.download(custom_ticker, period="1y", progress=False, threads=False)
-                    if not c_data.empty and 'Close' in c_data.columns and 'Volume' in c_data.columns:
-                        c_closes = c_data['Close'].squeeze().dropna()
-                        c_vols = c_data['Volume'].squeeze().dropna()
-                        
-                        if len(c_closes) > 60:
-                            # 1. Pull current data
-                            c_curr_price = float(c_closes.iloc[-1])
-                            c_curr_vol = float(c_vols.iloc[-1])
-                            c_vol_sma20 = float(c_vols.rolling(20).mean().iloc[-1])
-                            c_rsi = float(calculate_rsi(c_closes).iloc[-1])
-                            
-                            c_status, c_trigger = "⏳ WAIT", 0.0
-                            
-                            # 2. Run the strategy math
-                            if mode == "🛡️ Swing (Sentinel)":
-                                c_high_5d = c_closes.tail(6).iloc[:-1].max()
-                                c_sma200 = c_closes.rolling(200).mean().iloc[-1]
-                                c_perf = c_closes.iloc[-1] / c_closes.iloc[-60]
-                                c_trigger = c_high_5d
-                                
-                                if c_curr_price > c_high_5d and c_curr_price > c_sma200 and c_perf > nifty_perf:
-                                    c_status = "🎯 CONFIRMED" if is_safe_to_buy else "⛔ MKT WEAK"
+            custom_syms = list(dict.fromkeys(s.strip().replace('.NS', '') for s in c_input.split(',') if s.strip()))
+            w_cache = get_watchlist_cache()
+            c_results = {sym: w_cache.get((sym, mode)) for sym in custom_syms}
+            missing = [sym for sym, res in c_results.items() if res is None]
+            
+            if missing:
+                with st.spinner(f"Running quant engine on {', '.join(missing)}..."):
+                    try:
+                        # 🟢 One batched request for every cache miss
+                        w_closes, w_vols = fetch_watchlist_data([f"{sym}.NS" for sym in missing])
+                        for sym in missing:
+                            c_ticker = f"{sym}.NS"
+                            if c_ticker not in w_closes.columns or c_ticker not in w_vols.columns:
+                                res = {"error": "Invalid Ticker. Make sure it's an NSE stock."}
                             else:
-                                c_bb_w = calculate_bollinger_width(c_closes).iloc[-1]
-                                if c_bb_w < 0.10: c_status = "👀 WATCH (Squeeze)"
-                                elif (c_curr_vol > c_vol_sma20 * 1.5) and c_rsi > 55:
-                                    if is_safe_to_buy: 
-                                        c_status = "🚀 BREAKOUT"
-                                        c_trigger = c_curr_price
-                                    else: c_status = "⛔ MKT WEAK"
-                            
-                            # 3. Draw the Results Card
-                            bg_color = "#d4edda" if c_status in ["🎯 CONFIRMED", "🚀 BREAKOUT"] else ("#fff3cd" if c_status == "👀 WATCH (Squeeze)" else "#f8f9fa")
-                            border_color = "#28a745" if c_status in ["🎯 CONFIRMED", "🚀 BREAKOUT"] else ("#ffeeba" if c_status == "👀 WATCH (Squeeze)" else "#6c757d")
-                            vol_surge = (c_curr_vol / c_vol_sma20) * 100 if c_vol_sma20 > 0 else 0
-                            
-                            st.markdown(f"""
-                            <div style='border: 2px solid {border_color}; border-radius: 8px; padding: 15px; background-color: {bg_color}; color: #333;'>
-                                <h4 style='margin-top:0px; color: #111;'>{custom_sym} System Diagnostics</h4>
-                                <b>Signal:</b> {c_status} &nbsp;|&nbsp; <b>LTP:</b> ₹{c_curr_price:.2f} &nbsp;|&nbsp; <b>Target/Entry:</b> ₹{c_trigger:.2f}<br>
-                                <b>RSI:</b> {c_rsi:.1f} &nbsp;|&nbsp; <b>Volume Surge:</b> {vol_surge:.0f}%
-                            </div>
-                            """, unsafe_allow_html=True)
-                        else: st.warning(f"Not enough historical data to calculate 200 SMA on {custom_sym}.")
-                    else: st.error("Invalid Ticker. Make sure it's an NSE stock.")
-                except Exception as e: st.error(f"Error evaluating {custom_sym}: {e}")
+                                c_closes = w_closes[c_ticker].dropna()
+                                c_vols = w_vols[c_ticker].dropna()
+                                if c_closes.empty:
+                                    res = {"error": "Invalid Ticker. Make sure it's an NSE stock."}
+                                elif len(c_closes) <= 60:
+                                    res = {"error": f"Not enough historical data to calculate 200 SMA on {sym}."}
+                                else:
+                                    # Same engine as the main scan
+                                    c_status, c_trigger, _ = evaluate_setup(c_closes, c_vols, mode, nifty_perf, is_safe_to_buy)
+                                    c_curr_vol = float(c_vols.iloc[-1])
+                                    c_vol_sma20 = float(c_vols.rolling(20).mean().iloc[-1])
+                                    res = {
+                                        "status": c_status, "trigger": float(c_trigger), "price": float(c_closes.iloc[-1]),
+                                        "rsi": float(calculate_rsi(c_closes).iloc[-1]),
+                                        "vol_surge": (c_curr_vol / c_vol_sma20) * 100 if c_vol_sma20 > 0 else 0
+                                    }
+                            w_cache.set((sym, mode), res)
+                            c_results[sym] = res
+                    except Exception as e: st.error(f"Error evaluating {', '.join(missing)}: {e}")
+            
+            for custom_sym, res in c_results.items():
+                if res is None: continue
+                if "error" in res:
+                    st.warning(f"{custom_sym}: {res['error']}")
+                    continue
+                c_status = res['status']
+                
+                # Draw the Results Card
+                bg_color = "#d4edda" if c_status in ["🎯 CONFIRMED", "🚀 BREAKOUT"] else ("#fff3cd" if c_status == "👀 WATCH (Squeeze)" else "#f8f9fa")
+                border_color = "#28a745" if c_status in ["🎯 CONFIRMED", "🚀 BREAKOUT"] else ("#ffeeba" if c_status == "👀 WATCH (Squeeze)" else "#6c757d")
+                
+                st.markdown(f"""
+                <div style='border: 2px solid {border_color}; border-radius: 8px; padding: 15px; margin-bottom: 8px; background-color: {bg_color}; color: #333;'>
+                    <h4 style='margin-top:0px; color: #111;'>{custom_sym} System Diagnostics</h4>
+                    <b>Signal:</b> {c_status} &nbsp;|&nbsp; <b>LTP:</b> ₹{res['price']:.2f} &nbsp;|&nbsp; <b>Target/Entry:</b> ₹{res['trigger']:.2f}<br>
+                    <b>RSI:</b> {res['rsi']:.1f} &nbsp;|&nbsp; <b>Volume Surge:</b> {res['vol_surge']:.0f}%
+                </div>
+                """, unsafe_allow_html=True)
         
         st.divider()
         # --- END CUSTOM ANALYZER ---
@@ -341,109 +364,47 @@ with tab1:
 
         for ticker in TICKERS:
             try:
-                if ticker not in closes.columns: continue
-                series = closes[ticker].dropna()
-                vol_series = volumes[ticker].dropna()
-                if series.empty: continue
-                
-                curr_price = series.iloc[-1]
-                if pd.isna(curr_price): continue
-                
-                curr_vol = vol_series.iloc[-1]
-                vol_sma20 = vol_series.rolling(20).mean().iloc[-1]
-                
-                status, trigger_price = "⏳ WAIT", 0.0
-                symbol = ticker.replace(".NS", "")
-                
-                # 🟢 NEW: Isolate raw mathematical trigger from market filter
-                raw_technical_trigger = False 
-                
-                if mode == "🛡️ Swing (Sentinel)":
-                    high_5d = series.tail(6).iloc[:-1].max()
-                    sma200 = series.rolling(200).mean().iloc[-1]
-                    if len(series) > 60: stock_perf = series.iloc[-1] / series.iloc[-60]
-                    else: stock_perf = 0
-                    trigger_price = high_5d
-                    
-                    if curr_price > high_5d and curr_price > sma200 and stock_perf > nifty_perf:
-                        raw_technical_trigger = True
-                        if is_safe_to_buy: status = "🎯 CONFIRMED"
-                        else: status = "⛔ MKT WEAK"
-                else: 
-                    bb_w = calculate_bollinger_width(series).iloc[-1]
-                    rsi = calculate_rsi(series).iloc[-1]
-                    vol_ma = vol_series.rolling(20).mean().iloc[-1]
-                    
-                    if bb_w < 0.10: status = "👀 WATCH (Squeeze)"
-                    elif (vol_series.iloc[-1] > vol_ma * 1.5) and rsi > 55:
-                        raw_technical_trigger = True
-                        if is_safe_to_buy: 
-                            status = "🚀 BREAKOUT"
-                            trigger_price = curr_price
-                        else: 
-                            status = "⛔ MKT WEAK"
-
-                gap_pct = ((curr_price - trigger_price) / trigger_price) * 100 if trigger_price > 0 else 0
-                
+                if ticker not in market_data.pos: continue
+                # 🧠 1. SCORE + AI FEATURES (shared with the headless engine)
+                daily = market_data.series(ticker)
+                setup = intraday_bars.setup_series(ticker, sniper_tf, *daily) if (sniper_feed and intraday_bars) else None
+                sig = scan_symbol(ticker, *daily, mode, regime, setup=setup, setup_tf=sniper_tf)
+                if sig is None: continue
+                symbol, curr_price, status = sig["symbol"], sig["price"], sig["status"]
                 signal_time = "-"
-                
-                # 🧠 1. CALCULATE ALL AI FEATURES FIRST (For both Logging and Buying)
-                n_trend = round(float(intraday_pct), 2) if 'intraday_pct' in locals() else 0.0
-                try: c_vix = round(float(closes['^INDIAVIX'].dropna().iloc[-1]), 2)
-                except: c_vix = 15.0
-                
-                c_rvol = round(float(curr_vol / vol_sma20), 2) if vol_sma20 > 0 else 1.0
-                c_rsi = round(float(calculate_rsi(series).iloc[-1]), 2)
-                
-                c_sma200 = series.rolling(200).mean().iloc[-1]
-                c_dist = round(float(((curr_price - c_sma200) / c_sma200) * 100), 2) if c_sma200 > 0 else 0.0
 
                 # 🟢 2. LOGGING UPGRADE: Push all features to the Signal Log
-                if raw_technical_trigger:
+                if sig["raw_trigger"]:
                     active_symbols_now.append(symbol)
-                    if now.time() >= datetime.time(9, 15):
+                    if now.time() >= datetime.time(9, 15) and not engine_live:
                         if symbol not in st.session_state.signal_history:
                             current_time_str = now.strftime("%H:%M")
                             st.session_state.signal_history[symbol] = current_time_str
                             
-                            log_signal_cloud(symbol, current_time_str, status, n_trend, c_vix, c_rvol, c_rsi, c_dist, curr_price)
+                            f = sig["features"]
+                            log_signal_cloud(symbol, current_time_str, status, f["Nifty_Trend"], f["VIX"], f["RVol"], f["RSI"], f["SMA200_Dist"], curr_price)
                     
                 if symbol in st.session_state.signal_history:
                     signal_time = st.session_state.signal_history[symbol]
-                    start_time_obj = datetime.datetime.strptime(signal_time, "%H:%M").time()
-                    cutoff_start = datetime.time(10, 0)
-                    cutoff_now = datetime.time(15, 0)
-                    
-                    if now.time() >= cutoff_now and start_time_obj <= cutoff_start:
-                        # 🛡️ FATAL FLAW PATCH: Verify the stock didn't crash during the day
-                        if raw_technical_trigger:
-                            if curr_vol > vol_sma20: 
-                                status = "✅ STRONG BUY" if is_safe_to_buy else "⛔ MKT WEAK"
-                            else: 
-                                status = "⚠️ LOW VOL"
-                        else:
-                            status = "❌ FAILED SETUP" # It spiked in the morning but died by the afternoon
-
-                scan_results.append({
-                    "Stock": symbol, "Status": status, "Signal Time": signal_time,
-                    "Price": round(curr_price, 2), "Entry": round(trigger_price, 2),
-                    "Vol vs Avg": f"{(curr_vol/vol_sma20)*100:.0f}%" if vol_sma20 > 0 else "0%",
-                    "Gap %": f"{gap_pct:.1f}%"
-                })
+                    status = confirm_signal(sig, signal_time, now.time(), is_safe_to_buy)
+
+                scan_results.append(scan_row(sig, status, signal_time))
                 
                 # 🟢 3. BUY EXECUTION UPGRADE: Reuse the exact same AI features
-                if bot_active and status in ["🎯 CONFIRMED", "🚀 BREAKOUT", "✅ STRONG BUY"]:
+                if bot_active and status in BUY_STATUSES:
                     current_holdings = [x['Symbol'] for x in st.session_state.portfolio]
                     if symbol not in current_holdings and symbol not in st.session_state.blacklist:
                         
-                        new_trade = {
-                            "Date": now.strftime("%Y-%m-%d"), "EntryTime": now.strftime("%H:%M:%S"),
-                            "Symbol": symbol, "Ticker": ticker, "Qty": 1, "BuyPrice": curr_price,
-                            "StopPrice": curr_price * (1 - (risk_per_trade/100)), "Strategy": mode,
-                            # 🧠 SILENT AI FEATURES
-                            "VIX": c_vix, "Nifty_Trend": n_trend, "RVol": c_rvol,
-                            "RSI": c_rsi, "SMA200_Dist": c_dist
-                        }
+                        # 🧱 CONCENTRATION GATE: Sector cap + average correlation with the open book
+                        if gate_concentration:
+                            allowed, reason = risk_matrix.check_entry(ticker, [x['Ticker'] for x in st.session_state.portfolio], max_avg_corr, max_per_sector)
+                            if not allowed:
+                                if symbol not in st.session_state.gate_blocked:
+                                    st.session_state.gate_blocked.append(symbol)
+                                    st.session_state.notifications.append(f"🧱 {now.strftime('%H:%M')} - GATE BLOCKED: {symbol} ({reason})")
+                                continue
+                        
+                        new_trade = new_trade_record(sig, now, mode, risk_per_trade)
                         
                         st.session_state.portfolio.append(new_trade)
                         new_trades_added = True
@@ -452,20 +413,37 @@ with tab1:
             except: continue
 
         if scan_results:
-            df_scan = pd.DataFrame(scan_results)
-            sort_map = {"✅ STRONG BUY": 0, "🎯 CONFIRMED": 1, "🚀 BREAKOUT": 1, "⚠️ LOW VOL": 2, "⛔ MKT WEAK": 3, "👀 WATCH (Squeeze)": 4, "⏳ WAIT": 5}
-            df_scan['Sort'] = df_scan['Status'].map(sort_map)
-            df_scan = df_scan.sort_values('Sort').drop('Sort', axis=1)
-            
-            def highlight_status(s):
-                if s['Status'] == '✅ STRONG BUY': return ['background-color: #d4edda; color: #155724'] * len(s)
-                elif s['Status'] == '⛔ MKT WEAK': return ['background-color: #f8d7da; color: #721c24'] * len(s)
-                elif s['Status'] == '⚠️ LOW VOL': return ['background-color: #fff3cd; color: #856404'] * len(s)
-                else: return [''] * len(s)
-            
-            if not show_all: df_scan = df_scan[df_scan['Status'] != '⏳ WAIT']
-            scan_placeholder.dataframe(df_scan.style.apply(highlight_status, axis=1), use_container_width=True, hide_index=True)
-            
+            # 🟢 INCREMENTAL TABLE: Diff this cycle against the persistent keyed table
+            curr_scan = build_scan_frame(scan_results)
+            prev_scan = st.session_state.scan_table
+            # A Swing/Scalp or timeframe switch is a different scan, not market movement: rebuild from scratch
+            if st.session_state.scan_mode_key != (mode, sniper_tf):
+                prev_scan = None
+                st.session_state.scan_mode_key = (mode, sniper_tf)
+            changed, removed = diff_scan(prev_scan, curr_scan)
+
+            if len(changed) > 0 or len(removed) > 0 or st.session_state.scan_view_key != show_all:
+                feed, price_ticks = describe_changes(prev_scan, curr_scan, changed, removed, now.strftime('%H:%M'))
+                st.session_state.scan_changes = (st.session_state.scan_changes + feed)[-20:]
+                st.session_state.scan_price_ticks = price_ticks
+
+                table = apply_scan_diff(prev_scan, curr_scan, changed, removed)
+                st.session_state.scan_table = table
+
+                df_scan = table if show_all else table[table['Status'] != '⏳ WAIT']
+                st.session_state.scan_styled = style_scan(df_scan)
+                st.session_state.scan_view_key = show_all
+            else:
+                st.session_state.scan_price_ticks = 0
+
+            # Streamlit has no row-level patch API, so the cached Styler is only rebuilt when rows moved
+            scan_placeholder.dataframe(st.session_state.scan_styled, use_container_width=True, hide_index=True)
+
+            with st.expander(f"🔁 Changes Since Last Refresh ({len(changed)} rows, {st.session_state.scan_price_ticks} price-only)"):
+                if not st.session_state.scan_changes: st.caption("No status changes yet.")
+                for note in reversed(st.session_state.scan_changes[-10:]):
+                    st.caption(note)
+
             if bot_active and new_trades_added:
                 save_portfolio_cloud(st.session_state.portfolio)
         else: scan_placeholder.info("Scanner Active. No signals found yet.")
@@ -474,96 +452,53 @@ with tab1:
 # --- TAB 2: PORTFOLIO & AUTO-EXIT ---
 with tab2:
     if st.session_state.portfolio:
-        tickers = [p['Ticker'] for p in st.session_state.portfolio]
-        try:
-            live_data = yf.download(tickers, period="1d", interval="1m", threads=False, progress=False)['Close']
-        except: live_data = pd.DataFrame()
+        # 🟢 COLUMNAR BOOK: Parse positions once, rebuild only when the portfolio list itself changes
+        if st.session_state.get('book_src') is not st.session_state.portfolio or len(st.session_state.book['buy']) != len(st.session_state.portfolio):
+            st.session_state.book = build_book(st.session_state.portfolio)
+            st.session_state.book_src = st.session_state.portfolio
+        book = st.session_state.book
+        
+        # Same 1m feed as the Sniper bars; only hits the network if the scanner just bought a new ticker
+        intraday_bars = get_intraday_bars(intraday_universe + list(book['ticker']))
+        live_data = intraday_bars.last_closes() if intraday_bars else pd.DataFrame()
+        
+        # ⚡ One vectorized pass: valuation, risk-free, 0.96 trail and stop-hit for every position
+        val = value_book(book, latest_prices(live_data, book['ticker']))
         
-        total_val, total_inv = 0, 0
         portfolio_changed = False
         remaining_stocks = []
-        
-        today_pnl = 0.0
-        today_count = 0
-        winners = 0
-        losers = 0
         today_str = now.strftime("%Y-%m-%d") 
         
+        total_val, total_inv = float(val['cur_val'].sum()), float(val['inv_val'].sum())
+        today_mask = book['date'] == today_str
+        today_pnl = float(val['pnl'][today_mask].sum())
+        today_count = int(today_mask.sum())
+        winners = int((~val['glitch'] & (val['pnl'] > 0)).sum())
+        losers = int((~val['glitch'] & (val['pnl'] < 0)).sum())
+        
+        for i in np.flatnonzero(val['stop_moved']):
+            st.session_state.portfolio[i]['StopPrice'] = float(val['new_sl'][i])
+            portfolio_changed = True
+        book['stop'] = np.where(val['stop_moved'], val['new_sl'], book['stop'])
+        
+        sold_today = {j.get('Symbol') for j in st.session_state.journal if str(j.get('ExitDate')) == today_str}
+        
         for i, trade in enumerate(st.session_state.portfolio):
-            api_glitch = False
-            try:
-                if len(tickers) > 1 and not live_data.empty: price = live_data[trade['Ticker']].dropna().iloc[-1]
-                elif not live_data.empty: price = live_data.dropna().iloc[-1]
-                else: 
-                    price = float(trade['BuyPrice'])
-                    api_glitch = True
-                if pd.isna(price): 
-                    price = float(trade['BuyPrice'])
-                    api_glitch = True
-            except: 
-                price = float(trade['BuyPrice'])
-                api_glitch = True
-            
-            qty = int(trade['Qty'])
-            buy = float(trade['BuyPrice'])
-            sl = float(trade['StopPrice'])
-            
-            cur_val = price * qty
-            inv_val = buy * qty
-            pnl = cur_val - inv_val
-            pnl_pct = (pnl / inv_val) * 100
-            
-            total_val += cur_val
-            total_inv += inv_val
-            
-            if not api_glitch:
-                if pnl > 0: winners += 1
-                elif pnl < 0: losers += 1
-            
-            if str(trade.get('Date')) == today_str:
-                today_pnl += pnl
-                today_count += 1
-            
-            msg, new_sl = "", sl
-            
-            if not api_glitch:
-                if pnl_pct > 4.0 and sl < buy:
-                    new_sl = buy
-                    msg = "🛡️ RISK FREE"
-                
-                if pnl_pct > 6.0:
-                    trail = round(price * 0.96, 2)
-                    if trail > new_sl:
-                        new_sl = trail
-                        msg = "📈 TRAILING"
-                
-                if price <= new_sl: msg = "❌ STOP HIT"
-                
-                new_sl = round(new_sl, 2)
-                if new_sl != sl:
-                    trade['StopPrice'] = new_sl
-                    portfolio_changed = True
+            api_glitch = bool(val['glitch'][i])
+            price, buy = float(val['price'][i]), float(book['buy'][i])
+            pnl, pnl_pct = float(val['pnl'][i]), float(val['pnl_pct'][i])
+            new_sl, msg = float(val['new_sl'][i]), val['msg'][i]
             
             action_taken = False
-            
-            is_already_sold = any(
-                j.get('Symbol') == trade['Symbol'] and str(j.get('ExitDate')) == now.strftime("%Y-%m-%d") 
-                for j in st.session_state.journal
-            )
 
-            if is_already_sold:
+            if trade['Symbol'] in sold_today:
                 portfolio_changed = True
                 action_taken = True
                 if trade['Symbol'] not in st.session_state.blacklist:
                     st.session_state.blacklist.append(trade['Symbol'])
             
-            elif auto_sell and not api_glitch and (price <= new_sl):
-                closed_trade = trade.copy()
-                closed_trade.update({
-                    'ExitPrice': price, 'ExitDate': now.strftime("%Y-%m-%d"), 
-                    'ExitTime': now.strftime("%H:%M:%S"), 'PnL': pnl, 
-                    'Result': "WIN" if pnl > 0 else "LOSS"
-                })
+            elif auto_sell and val['stop_hit'][i]:
+                closed_trade = closed_trade_record(trade, price, pnl, now)
                 
                 if log_trade_journal(closed_trade):
                     st.session_state.notifications.append(f"🛑 {now.strftime('%H:%M')} - AUTO-SOLD: {trade['Symbol']} at ₹{price:.2f}")
@@ -582,13 +517,8 @@ with tab2:
                     
                 c4.metric("Stop Loss", f"{new_sl:.2f}", help="Auto-Managed")
                 
-                if c5.button(f"✅ CLOSE {msg}", key=f"close_{trade['Symbol']}", disabled=api_glitch):
-                    closed_trade = trade.copy()
-                    closed_trade.update({
-                        'ExitPrice': price, 'ExitDate': now.strftime("%Y-%m-%d"), 
-                        'ExitTime': now.strftime("%H:%M:%S"), 'PnL': pnl, 
-                        'Result': "WIN" if pnl > 0 else "LOSS"
-                    })
+                if c5.button(f"✅ CLOSE {msg}", key=f"close_{trade['Symbol']}", disabled=api_glitch or engine_live):
+                    closed_trade = closed_trade_record(trade, price, pnl, now)
                     
                     if log_trade_journal(closed_trade):
                         st.session_state.notifications.append(f"👤 {now.strftime('%H:%M')} - MANUALLY CLOSED: {trade['Symbol']} at ₹{price:.2f}")
@@ -600,7 +530,7 @@ with tab2:
             if not action_taken:
                 remaining_stocks.append(trade)
         
-        if portfolio_changed:
+        if portfolio_changed and not engine_live:
             st.session_state.portfolio = remaining_stocks
             save_portfolio_cloud(st.session_state.portfolio)
             st.rerun()
@@ -619,6 +549,9 @@ with tab2:
             else: c3.metric(f"Today's PnL ({today_count} trades)", f"₹{today_pnl:,.2f}", "📉 Sourced Today")
                 
             c4.metric("Live Market Heat", f"{winners} Green / {losers} Red", border=True)
+            
+            sector_mix = risk_matrix.sector_exposure(book['ticker'])
+            st.caption("🧱 Sector Exposure: " + " · ".join(f"{sec} {cnt}" for sec, cnt in sector_mix.items()))
     else: st.info("Portfolio Empty. Go to Scanner to find stocks.")
 
 # --- TAB 3: ANALYSIS ---
@@ -655,7 +588,7 @@ with tab3:
                 st.session_state.show_audit = not st.session_state.show_audit
                 
             if st.session_state.show_audit:
-                run_advanced_audit(df_j)
+                run_advanced_audit(df_j, risk_per_trade)
         else: st.info("No valid trades found in Journal.")
         
         st.divider()